@@ -1,16 +1,208 @@
+import asyncio
 import datetime
+import gzip
+import hashlib
+import hmac
+import ipaddress
+import json
+import os
 import random
-from flask import Flask, render_template_string, request, redirect, session, url_for
-import yfinance as yf
-import pandas as pd
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import (Flask, Response, before_render_template, g, has_app_context, jsonify, make_response,
+                   render_template, request, redirect, session, stream_with_context, template_rendered, url_for)
+from jinja2 import DictLoader
+from markupsafe import Markup
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from leaderboard import ContestLeaderboard, LeaderboardBook
+from metrics import LabelLimiter, Registry, SlowRequestProfiler
+from orders import ORDER_LABELS, OrderEngine, OrderError, OrderWatcher
+from price_providers import ReplayClock, ReplayProvider, YFinanceProvider
+from quote_cache import QuoteCache
+from quote_refresher import QuoteRefresher
+from quote_stream import QuoteFeed
+from risk import RANKING_KEYS, RANKING_LABELS, RiskModel
+from shared_quotes import SharedQuoteTable, WriterElection
+from symbol_universe import SymbolUniverse
+from storage import LedgerError, MemoryStorage, SQLiteStorage, ledger_entry
+from trade_engine import TradeEngine
+from valuation import HoldingsStore
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
 
 # --- Flask App Initialization ---
 app = Flask(__name__)
 app.secret_key = 'supersecretkey'
 
+# Quote cache tuning (seconds / entries); override through the environment
+app.config['QUOTE_CACHE_TTL'] = float(os.environ.get('MOCKVEST_QUOTE_CACHE_TTL', 30))
+app.config['QUOTE_CACHE_NEGATIVE_TTL'] = float(os.environ.get('MOCKVEST_QUOTE_CACHE_NEGATIVE_TTL', 5))
+app.config['QUOTE_CACHE_MAX_SIZE'] = int(os.environ.get('MOCKVEST_QUOTE_CACHE_MAX_SIZE', 1024))
+
+# Background refresher: when enabled, pages read quotes from memory only and
+# trades fetch synchronously only if the quote is older than QUOTE_MAX_STALENESS
+app.config['QUOTE_REFRESHER'] = os.environ.get('MOCKVEST_QUOTE_REFRESHER', '0') == '1'
+app.config['QUOTE_REFRESH_INTERVAL'] = float(os.environ.get('MOCKVEST_QUOTE_REFRESH_INTERVAL', 15))
+app.config['QUOTE_MAX_STALENESS'] = float(os.environ.get('MOCKVEST_QUOTE_MAX_STALENESS', 30))
+# Without the refresher, symbols with resting orders are re-quoted this often (seconds)
+app.config['ORDER_WATCH_INTERVAL'] = float(os.environ.get('MOCKVEST_ORDER_WATCH_INTERVAL', 15))
+
+# Cross-process quote table: one elected worker fetches upstream and publishes
+# quotes to shared memory; every other worker reads them lock-free
+app.config['SHARED_QUOTES'] = os.environ.get('MOCKVEST_SHARED_QUOTES', '0') == '1'
+app.config['SHARED_QUOTES_NAME'] = os.environ.get('MOCKVEST_SHARED_QUOTES_NAME', 'mockvest_quotes')
+app.config['SHARED_QUOTES_SLOTS'] = int(os.environ.get('MOCKVEST_SHARED_QUOTES_SLOTS', 4096))
+app.config['SHARED_QUOTES_LOCK'] = os.environ.get('MOCKVEST_SHARED_QUOTES_LOCK', '/tmp/mockvest_quotes.lock')
+
+# Price source: 'yfinance' (live) or 'replay' (local OHLC files under REPLAY_DIR,
+# replayed from REPLAY_START at REPLAY_SPEED seconds per second)
+app.config['PRICE_PROVIDER'] = os.environ.get('MOCKVEST_PRICE_PROVIDER', 'yfinance')
+app.config['REPLAY_DIR'] = os.environ.get('MOCKVEST_REPLAY_DIR', 'replay_data')
+app.config['REPLAY_START'] = os.environ.get('MOCKVEST_REPLAY_START')
+app.config['REPLAY_SPEED'] = float(os.environ.get('MOCKVEST_REPLAY_SPEED', 0))
+
+# Risk analytics: rolling window (trading days) of daily returns, the benchmark
+# for beta and the annual risk-free rate used in the Sharpe ratio
+app.config['RISK_BENCHMARK'] = os.environ.get('MOCKVEST_RISK_BENCHMARK', 'SPY')
+app.config['RISK_WINDOW'] = int(os.environ.get('MOCKVEST_RISK_WINDOW', 60))
+app.config['RISK_FREE_RATE'] = float(os.environ.get('MOCKVEST_RISK_FREE_RATE', 0.0))
+
+# Tradable symbols (CSV: symbol,name,exchange). Unlisted tickers are rejected
+# without a price lookup; with no file every symbol goes to the price provider
+app.config['SYMBOL_UNIVERSE'] = os.environ.get('MOCKVEST_SYMBOL_UNIVERSE', 'symbols.csv')
+app.config['SYMBOL_UNIVERSE_CHECK_INTERVAL'] = float(os.environ.get('MOCKVEST_SYMBOL_UNIVERSE_CHECK_INTERVAL', 5))
+
+# Async views (see asgi.py): dashboard, portfolio and leaderboard await one
+# batched fetch of their uncached quotes on a pool of ASYNC_FETCH_CONCURRENCY
+# threads, rendering without them after ASYNC_FETCH_TIMEOUT seconds
+app.config['ASYNC_VIEWS'] = os.environ.get('MOCKVEST_ASYNC_VIEWS', '0') == '1'
+app.config['ASYNC_FETCH_CONCURRENCY'] = int(os.environ.get('MOCKVEST_ASYNC_FETCH_CONCURRENCY', 16))
+app.config['ASYNC_FETCH_TIMEOUT'] = float(os.environ.get('MOCKVEST_ASYNC_FETCH_TIMEOUT', 5))
+
+# Responses of at least COMPRESS_MIN_SIZE bytes are gzip- (or brotli-) encoded
+# for clients that accept it; the market snapshot may be cached for
+# SNAPSHOT_MAX_AGE seconds, by shared caches too
+app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('MOCKVEST_COMPRESS_MIN_SIZE', 1024))
+app.config['COMPRESS_LEVEL'] = int(os.environ.get('MOCKVEST_COMPRESS_LEVEL', 6))
+app.config['SNAPSHOT_MAX_AGE'] = int(os.environ.get('MOCKVEST_SNAPSHOT_MAX_AGE', 5))
+
+# Set when the app is loaded once in the gunicorn master and forked (--preload,
+# see gunicorn.conf.py): background threads then start in each worker, post-fork
+app.config['PRELOAD'] = os.environ.get('MOCKVEST_PRELOAD', '0') == '1'
+
+# Set to a file path to persist the trade ledger in SQLite, shared by all workers
+app.config['DATABASE'] = os.environ.get('MOCKVEST_DATABASE')
+
+# Seconds between keep-alive comments on idle /stream connections
+app.config['STREAM_KEEPALIVE'] = float(os.environ.get('MOCKVEST_STREAM_KEEPALIVE', 15))
+
+# Longest a /stream response stays open (keep it under the worker timeout);
+# the browser reconnects STREAM_RETRY_MS after it ends
+app.config['STREAM_MAX_SECONDS'] = float(os.environ.get('MOCKVEST_STREAM_MAX_SECONDS', 25))
+app.config['STREAM_RETRY_MS'] = int(os.environ.get('MOCKVEST_STREAM_RETRY_MS', 1000))
+
+# Open /stream responses allowed per worker. Each holds a worker thread, so keep
+# this below the thread count (MOCKVEST_THREADS, see gunicorn.conf.py) or pages
+# queue behind streams; clients over the cap get a 503 and retry later.
+app.config['STREAM_MAX_CLIENTS'] = int(os.environ.get('MOCKVEST_STREAM_MAX_CLIENTS',
+                                                      max(int(os.environ.get('MOCKVEST_THREADS', 8)) // 2, 1)))
+app.config['STREAM_BUSY_RETRY_MS'] = int(os.environ.get('MOCKVEST_STREAM_BUSY_RETRY_MS', 5000))
+
+# Keep the stacks of the N slowest requests (0 disables the sampling profiler)
+app.config['PROFILE_SLOWEST'] = int(os.environ.get('MOCKVEST_PROFILE_SLOWEST', 0))
+
+# At most this many symbols get their own series in per-symbol metrics; the rest share "other"
+app.config['METRICS_MAX_SYMBOLS'] = int(os.environ.get('MOCKVEST_METRICS_MAX_SYMBOLS', 500))
+
+# /metrics and /metrics/slowest answer only clients in METRICS_ALLOW (comma-separated
+# networks; loopback by default) or requests carrying "Authorization: Bearer <METRICS_TOKEN>".
+# Behind a proxy every client shares the proxy's address, so set a token there.
+app.config['METRICS_ALLOW'] = os.environ.get('MOCKVEST_METRICS_ALLOW', '127.0.0.0/8,::1/128')
+app.config['METRICS_TOKEN'] = os.environ.get('MOCKVEST_METRICS_TOKEN')
+
+# --- Instrumentation ---
+metrics = Registry()
+request_seconds = metrics.histogram('mockvest_request_seconds', 'Request latency by route.',
+                                    ['endpoint', 'method', 'status'])
+render_seconds = metrics.histogram('mockvest_template_render_seconds', 'Template render time.', ['template'])
+quote_fetch_seconds = metrics.histogram('mockvest_quote_fetch_seconds', 'Upstream single-symbol fetch latency.',
+                                        ['symbol'])
+quote_batch_fetch_seconds = metrics.histogram('mockvest_quote_batch_fetch_seconds',
+                                              'Upstream batched fetch latency.')
+quote_fetches = metrics.counter('mockvest_quote_fetches_total', 'Upstream symbol lookups.', ['symbol'])
+quote_fetch_errors = metrics.counter('mockvest_quote_fetch_errors_total',
+                                     'Upstream symbol lookups that returned no price.', ['symbol'])
+trades_total = metrics.counter('mockvest_trades_total', 'Orders filled.', ['action'])
+async_fetch_timeouts = metrics.counter('mockvest_async_fetch_timeouts_total',
+                                       'Async quote lookups abandoned after ASYNC_FETCH_TIMEOUT.', ['symbol'])
+symbol_rejections = metrics.counter('mockvest_symbol_rejections_total',
+                                    'Lookups rejected because the symbol is not in the universe.')
+symbol_labels = LabelLimiter(app.config['METRICS_MAX_SYMBOLS'])
+
+def symbol_label(symbol, price=None):
+    """The `symbol` label for a lookup. Symbols come from user input, so only
+       validated ones (listed in the universe or, without one, seen with a
+       price) are used verbatim; anything else is labelled "unknown"."""
+    listed = symbol in symbol_universe  # reloads first, which may set `loaded`
+    if symbol_universe.loaded:
+        valid = listed
+    else:
+        valid = price is not None or symbol in symbol_labels
+    return symbol_labels(symbol) if valid else 'unknown'
+
+profiler = None
+if app.config['PROFILE_SLOWEST'] > 0:
+    profiler = SlowRequestProfiler(keep=app.config['PROFILE_SLOWEST'])
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    if profiler is not None:
+        profiler.begin()
+
+@app.after_request
+def remember_response_status(response):
+    g.response_status = response.status_code
+    return response
+
+@app.teardown_request
+def record_request_time(exc):
+    # Teardown runs even when the view or an after_request hook raised
+    started = g.pop('request_started', None)
+    if started is not None:
+        duration = time.perf_counter() - started
+        status = 500 if exc is not None else g.pop('response_status', 500)
+        request_seconds.observe(duration, request.endpoint or 'unknown', request.method, status)
+        if profiler is not None:
+            profiler.end(duration, '%s %s' % (request.method, request.full_path))
+
+_render_state = threading.local()
+
+def _render_started(sender, template, context, **extra):
+    stack = getattr(_render_state, 'stack', None)
+    if stack is None:
+        stack = _render_state.stack = []
+    stack.append(time.perf_counter())
+
+def _render_finished(sender, template, context, **extra):
+    stack = getattr(_render_state, 'stack', None)
+    if stack:
+        render_seconds.observe(time.perf_counter() - stack.pop(), template.name or 'string')
+
+before_render_template.connect(_render_started, app)
+template_rendered.connect(_render_finished, app)
+
 # --- In-Memory Data Storage ---
 # For a production app, use a DB (SQLite/Postgres/etc.)
-users = {}  # {username: {password: '...', balance: 100000, portfolio: {}, contests: []}}
+users = {}  # {username: {password_hash: '...', balance: 100000, portfolio: {}, contests: []}}
 portfolios = {}  # {username: {symbol: {shares: 10, purchase_price: 150.00}}}
 
 # renamed contests -> contests_data to avoid name collision with route function
@@ -31,6 +223,9 @@ contests_data = {
     }
 }
 
+# Symbols shown in the dashboard's Market Snapshot
+market_symbols = ['AAPL', 'GOOG', 'MSFT', 'AMZN']
+
 # --- HTML Templates (as strings) ---
 LOGIN_HTML = """
 <!doctype html>
@@ -83,7 +278,7 @@ LOGIN_HTML = """
 </html>
 """
 
-# mark content safe when rendering ({{ content|safe }}) so inner templates render as HTML
+# Page templates extend this layout and fill in the content block
 BASE_HTML = """
 <!DOCTYPE html>
 <html lang="en">
@@ -104,44 +299,98 @@ BASE_HTML = """
         </div>
     </nav>
     <main class="container mx-auto mt-8 p-4">
-        {{ content|safe }}
+        {% block content %}{% endblock %}
     </main>
 </body>
 </html>
 """
 
 DASHBOARD_HTML = """
+{% extends "base.html" %}
+{% block content %}
 <h2 class="text-2xl font-bold mb-4">Dashboard</h2>
 <div class="bg-white p-6 rounded-lg shadow-md">
   <p class="text-lg mb-2"><strong>Current Balance:</strong> ${{ "{:,.2f}".format(balance) }}</p>
-  <p class="text-lg mb-2"><strong>Portfolio Value:</strong> ${{ "{:,.2f}".format(portfolio_value) }}</p>
-  <p class="text-lg"><strong>Total Net Worth:</strong> ${{ "{:,.2f}".format(net_worth) }}</p>
+  <p class="text-lg mb-2"><strong>Portfolio Value:</strong> $<span id="portfolio-value">{{ "{:,.2f}".format(portfolio_value) }}</span></p>
+  <p class="text-lg"><strong>Total Net Worth:</strong> $<span id="net-worth">{{ "{:,.2f}".format(net_worth) }}</span></p>
 </div>
 
 <div class="mt-8">
-  <h3 class="text-xl font-bold mb-4">Market Snapshot</h3>
-  <p class="text-gray-600 mb-2">Prices are updated with each page refresh.</p>
-  <div class="bg-white p-6 rounded-lg shadow-md">
-    <ul class="space-y-2">
-      {% for symbol, price in market_data.items() %}
-      <li class="flex justify-between items-center py-2 border-b last:border-b-0">
-        <span class="font-semibold">{{ symbol }}</span>
-        {% if price is not none %}
-          <span class="text-sm text-green-600">${{ "{:,.2f}".format(price) }}</span>
-        {% else %}
-          <span class="text-sm text-gray-500">N/A</span>
-        {% endif %}
-      </li>
-      {% endfor %}
-    </ul>
-  </div>
+  {{ market_snapshot }}
 </div>
+
+{% if live_updates %}
+<script>
+  // Live quotes: the server pushes only what changed
+  (function () {
+    if (!window.EventSource) return;
+    const money = (v) => v.toLocaleString('en-US', {minimumFractionDigits: 2, maximumFractionDigits: 2});
+    const onmessage = function (event) {
+      const update = JSON.parse(event.data);
+      for (const [symbol, price] of Object.entries(update.quotes || {})) {
+        const el = document.querySelector('[data-quote="' + symbol + '"]');
+        if (el && price !== null) {
+          el.textContent = '$' + money(price);
+          el.className = 'text-sm text-green-600';
+        }
+      }
+      if (update.portfolio_value !== undefined) {
+        document.getElementById('portfolio-value').textContent = money(update.portfolio_value);
+      }
+      if (update.net_worth !== undefined) {
+        document.getElementById('net-worth').textContent = money(update.net_worth);
+      }
+    };
+    // EventSource retries by itself only after a stream ends normally; when the
+    // worker turns us away (503, stream limit) it gives up, so reconnect here
+    const connect = function () {
+      const source = new EventSource("{{ url_for('stream') }}");
+      source.onmessage = onmessage;
+      source.onerror = function () {
+        if (source.readyState === EventSource.CLOSED) {
+          setTimeout(connect, {{ stream_busy_retry_ms }} + Math.random() * 1000);
+        }
+      };
+    };
+    connect();
+  })();
+</script>
+{% endif %}
+{% endblock %}
 """
 
 PORTFOLIO_HTML = """
+{% extends "base.html" %}
+{% block content %}
 <h2 class="text-2xl font-bold mb-4">My Portfolio</h2>
 <div class="bg-white p-6 rounded-lg shadow-md">
-  <p class="text-lg mb-4"><strong>Current Balance:</strong> ${{ "{:,.2f}".format(balance) }}</p>
+  <p class="text-lg mb-2"><strong>Current Balance:</strong> ${{ "{:,.2f}".format(balance) }}</p>
+  <p class="text-lg mb-4"><strong>Unrealized P&amp;L:</strong>
+    <span class="text-{{ 'green' if unrealized_pnl >= 0 else 'red' }}-600">
+      ${{ "{:,.2f}".format(unrealized_pnl) }} ({{ "{:,.2f}".format(unrealized_returns) }}%)
+    </span>
+  </p>
+  {% if risk %}
+  <div class="grid grid-cols-2 md:grid-cols-4 gap-4 mb-6 text-sm">
+    <div class="bg-gray-50 p-3 rounded">
+      <p class="text-gray-500">Volatility (annualized)</p>
+      <p class="text-lg font-semibold">{{ "{:,.2f}".format(risk['volatility']) }}%</p>
+    </div>
+    <div class="bg-gray-50 p-3 rounded">
+      <p class="text-gray-500">Beta vs {{ benchmark }}</p>
+      <p class="text-lg font-semibold">{{ "{:,.2f}".format(risk['beta']) if risk['beta'] is not none else 'N/A' }}</p>
+    </div>
+    <div class="bg-gray-50 p-3 rounded">
+      <p class="text-gray-500">Sharpe Ratio</p>
+      <p class="text-lg font-semibold">{{ "{:,.2f}".format(risk['sharpe']) if risk['sharpe'] is not none else 'N/A' }}</p>
+    </div>
+    <div class="bg-gray-50 p-3 rounded">
+      <p class="text-gray-500">1-Day VaR (95%)</p>
+      <p class="text-lg font-semibold">${{ "{:,.2f}".format(risk['var']) }}</p>
+    </div>
+  </div>
+  <p class="text-xs text-gray-500 mb-6">Based on the last {{ risk['days'] }} daily returns of your current holdings.</p>
+  {% endif %}
 
   <h3 class="text-xl font-semibold mb-4">Holdings</h3>
   {% if not holdings %}
@@ -179,11 +428,46 @@ PORTFOLIO_HTML = """
   </div>
   {% endif %}
 
+  <h3 class="text-xl font-semibold mt-8 mb-4">Open Orders</h3>
+  {% if not open_orders %}
+    <p class="text-gray-600 italic">You have no open orders.</p>
+  {% else %}
+  <div class="overflow-x-auto">
+    <table class="min-w-full divide-y divide-gray-200">
+      <thead class="bg-gray-50">
+        <tr>
+          <th class="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">Type</th>
+          <th class="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">Symbol</th>
+          <th class="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">Shares</th>
+          <th class="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">Trigger Price</th>
+          <th class="px-6 py-3"></th>
+        </tr>
+      </thead>
+      <tbody class="bg-white divide-y divide-gray-200">
+        {% for order in open_orders %}
+        <tr>
+          <td class="px-6 py-4 whitespace-nowrap font-medium text-gray-900">{{ order_labels[order['type']] }}</td>
+          <td class="px-6 py-4 whitespace-nowrap text-gray-500">{{ order['symbol'] }}</td>
+          <td class="px-6 py-4 whitespace-nowrap text-gray-500">{{ order['shares'] }}</td>
+          <td class="px-6 py-4 whitespace-nowrap text-gray-500">${{ "{:,.2f}".format(order['trigger']) }}</td>
+          <td class="px-6 py-4 whitespace-nowrap text-right">
+            <form method="post" action="{{ url_for('cancel_order', order_id=order['id']) }}">
+              <button type="submit" class="text-sm text-red-600 hover:text-red-800">Cancel</button>
+            </form>
+          </td>
+        </tr>
+        {% endfor %}
+      </tbody>
+    </table>
+  </div>
+  {% endif %}
+
   <h3 class="text-xl font-semibold mt-8 mb-4">Trade Stocks</h3>
   <form action="{{ url_for('trade_stock') }}" method="post" class="space-y-4">
     <div>
       <label for="symbol" class="block text-sm font-medium text-gray-700">Stock Symbol</label>
       <input type="text" name="symbol" id="symbol" placeholder="e.g., AAPL, GOOG" required
+             list="symbol-options" autocomplete="off" data-symbol-search
              class="mt-1 block w-full rounded-md border-gray-300 shadow-sm focus:border-blue-500 focus:ring focus:ring-blue-500 focus:ring-opacity-50 px-3 py-2">
     </div>
     <div>
@@ -196,37 +480,178 @@ PORTFOLIO_HTML = """
       <button type="submit" name="action" value="sell" class="flex-1 bg-red-600 hover:bg-red-700 text-white font-bold py-2 px-4 rounded-lg transition duration-200">Sell</button>
     </div>
   </form>
+
+  <h3 class="text-xl font-semibold mt-8 mb-4">Place a Limit or Stop Order</h3>
+  <form action="{{ url_for('place_order') }}" method="post" class="space-y-4">
+    <div>
+      <label for="order_symbol" class="block text-sm font-medium text-gray-700">Stock Symbol</label>
+      <input type="text" name="symbol" id="order_symbol" placeholder="e.g., AAPL, GOOG" required
+             list="symbol-options" autocomplete="off" data-symbol-search
+             class="mt-1 block w-full rounded-md border-gray-300 shadow-sm focus:border-blue-500 focus:ring focus:ring-blue-500 focus:ring-opacity-50 px-3 py-2">
+    </div>
+    <div>
+      <label for="order_type" class="block text-sm font-medium text-gray-700">Order Type</label>
+      <select name="order_type" id="order_type"
+              class="mt-1 block w-full rounded-md border-gray-300 shadow-sm focus:border-blue-500 focus:ring focus:ring-blue-500 focus:ring-opacity-50 px-3 py-2">
+        {% for value, label in order_labels.items() %}
+          <option value="{{ value }}">{{ label }}</option>
+        {% endfor %}
+      </select>
+    </div>
+    <div>
+      <label for="order_shares" class="block text-sm font-medium text-gray-700">Number of Shares</label>
+      <input type="number" name="shares" id="order_shares" min="1" required
+             class="mt-1 block w-full rounded-md border-gray-300 shadow-sm focus:border-blue-500 focus:ring focus:ring-blue-500 focus:ring-opacity-50 px-3 py-2">
+    </div>
+    <div>
+      <label for="trigger_price" class="block text-sm font-medium text-gray-700">Trigger Price</label>
+      <input type="number" name="trigger_price" id="trigger_price" min="0.01" step="0.01" required
+             class="mt-1 block w-full rounded-md border-gray-300 shadow-sm focus:border-blue-500 focus:ring focus:ring-blue-500 focus:ring-opacity-50 px-3 py-2">
+    </div>
+    <button type="submit" class="w-full bg-blue-600 hover:bg-blue-700 text-white font-bold py-2 px-4 rounded-lg transition duration-200">Place Order</button>
+  </form>
+  <datalist id="symbol-options"></datalist>
 </div>
+
+<script>
+  // Symbol autocomplete from the local universe
+  (function () {
+    const options = document.getElementById('symbol-options');
+    let pending = null;
+    document.querySelectorAll('[data-symbol-search]').forEach(function (input) {
+      input.addEventListener('input', function () {
+        clearTimeout(pending);
+        const prefix = input.value.trim();
+        if (!prefix) return;
+        pending = setTimeout(function () {
+          fetch("{{ url_for('symbols') }}?prefix=" + encodeURIComponent(prefix))
+            .then((response) => response.json())
+            .then(function (matches) {
+              options.innerHTML = '';
+              for (const match of matches) {
+                const option = document.createElement('option');
+                option.value = match.symbol;
+                option.label = match.name + (match.exchange ? ' (' + match.exchange + ')' : '');
+                options.appendChild(option);
+              }
+            });
+        }, 150);
+      });
+    });
+  })();
+</script>
+{% endblock %}
 """
 
 CONTESTS_HTML = """
+{% extends "base.html" %}
+{% block content %}
 <h2 class="text-2xl font-bold mb-4">Join a Contest</h2>
 <div class="grid md:grid-cols-2 gap-6">
-  {% for contest_id, contest_data in contests.items() %}
-  <div class="bg-white p-6 rounded-lg shadow-md flex flex-col justify-between">
-    <div>
-      <h3 class="text-xl font-semibold mb-2">{{ contest_data['name'] }}</h3>
-      <p class="text-gray-600 mb-2"><strong>Entry Fee:</strong> ${{ "{:,.2f}".format(contest_data['entry_fee']) }}</p>
-      <p class="text-gray-600 mb-4"><strong>Participants:</strong> {{ contest_data['participants'] | length }}</p>
-    </div>
-    <div class="flex items-center space-x-4">
-      {% if username in contest_data['participants'] %}
-        <span class="text-sm font-medium text-green-600">Joined!</span>
-        <a href="{{ url_for('leaderboard', contest_id=contest_id) }}" class="bg-blue-600 hover:bg-blue-700 text-white font-bold py-2 px-4 rounded-lg transition duration-200">View Leaderboard</a>
+  {% for card in contest_cards %}
+    {{ card }}
+  {% endfor %}
+</div>
+{% endblock %}
+"""
+
+# Fragments below are rendered separately and cached on their inputs
+MARKET_SNAPSHOT_HTML = """
+<h3 class="text-xl font-bold mb-4">Market Snapshot</h3>
+<p class="text-gray-600 mb-2">Prices update live while this page is open.</p>
+<div class="bg-white p-6 rounded-lg shadow-md">
+  <ul class="space-y-2">
+    {% for symbol, price in market_data.items() %}
+    <li class="flex justify-between items-center py-2 border-b last:border-b-0">
+      <span class="font-semibold">{{ symbol }}</span>
+      {% if price is not none %}
+        <span class="text-sm text-green-600" data-quote="{{ symbol }}">
+          ${{ "{:,.2f}".format(price) }}
+          {% if quote_times[symbol] is not none %}
+            <span class="text-xs text-gray-400">(as of {{ quote_times[symbol] | clock }} UTC)</span>
+          {% endif %}
+        </span>
       {% else %}
-        <form method="post" action="{{ url_for('join_contest', contest_id=contest_id) }}">
-          <button type="submit" class="bg-blue-600 hover:bg-blue-700 text-white font-bold py-2 px-4 rounded-lg transition duration-200">Join Contest</button>
-        </form>
+        <span class="text-sm text-gray-500" data-quote="{{ symbol }}">N/A</span>
       {% endif %}
-    </div>
+    </li>
+    {% endfor %}
+  </ul>
+</div>
+"""
+
+CONTEST_CARD_HTML = """
+<div class="bg-white p-6 rounded-lg shadow-md flex flex-col justify-between">
+  <div>
+    <h3 class="text-xl font-semibold mb-2">{{ contest_data['name'] }}</h3>
+    <p class="text-gray-600 mb-2"><strong>Entry Fee:</strong> ${{ "{:,.2f}".format(contest_data['entry_fee']) }}</p>
+    <p class="text-gray-600 mb-4"><strong>Participants:</strong> {{ contest_data['participants'] | length }}</p>
+  </div>
+  <div class="flex items-center space-x-4">
+    {% if joined %}
+      <span class="text-sm font-medium text-green-600">Joined!</span>
+      <a href="{{ url_for('leaderboard', contest_id=contest_id) }}" class="bg-blue-600 hover:bg-blue-700 text-white font-bold py-2 px-4 rounded-lg transition duration-200">View Leaderboard</a>
+    {% else %}
+      <form method="post" action="{{ url_for('join_contest', contest_id=contest_id) }}">
+        <button type="submit" class="bg-blue-600 hover:bg-blue-700 text-white font-bold py-2 px-4 rounded-lg transition duration-200">Join Contest</button>
+      </form>
+    {% endif %}
   </div>
-  {% endfor %}
 </div>
 """
 
+REPLAY_HTML = """
+{% extends "base.html" %}
+{% block content %}
+<h2 class="text-2xl font-bold mb-4">Contest Replay: {{ contest_name }}</h2>
+<p class="text-gray-600 mb-4">Scored on daily closes from {{ start_date }} to {{ end_date }} ({{ n_days }} trading days).</p>
+<div class="bg-white p-6 rounded-lg shadow-md">
+  {% if not standings %}
+    <p class="text-gray-600 italic">No price history is available for this contest yet.</p>
+  {% else %}
+  <div class="overflow-x-auto">
+    <table class="min-w-full divide-y divide-gray-200">
+      <thead class="bg-gray-50">
+        <tr>
+          <th class="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">Rank</th>
+          <th class="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">Username</th>
+          <th class="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">Net Worth</th>
+          <th class="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">Returns (%)</th>
+          <th class="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">Max Drawdown (%)</th>
+        </tr>
+      </thead>
+      <tbody class="bg-white divide-y divide-gray-200">
+        {% for participant in standings %}
+        <tr>
+          <td class="px-6 py-4 whitespace-nowrap font-medium text-gray-900">{{ participant['rank'] }}</td>
+          <td class="px-6 py-4 whitespace-nowrap text-gray-500">{{ participant['username'] }}</td>
+          <td class="px-6 py-4 whitespace-nowrap text-gray-500">${{ "{:,.2f}".format(participant['net_worth']) }}</td>
+          <td class="px-6 py-4 whitespace-nowrap text-{{ 'green' if participant['returns'] >= 0 else 'red' }}-600 font-semibold">{{ "{:,.2f}".format(participant['returns']) }}%</td>
+          <td class="px-6 py-4 whitespace-nowrap text-gray-500">{{ "{:,.2f}".format(participant['max_drawdown']) }}%</td>
+        </tr>
+        {% endfor %}
+      </tbody>
+    </table>
+  </div>
+  {% endif %}
+</div>
+{% endblock %}
+"""
+
 LEADERBOARD_HTML = """
+{% extends "base.html" %}
+{% block content %}
 <h2 class="text-2xl font-bold mb-4">Leaderboard: {{ contest_name }}</h2>
+<p class="mb-4"><a href="{{ url_for('contest_replay', contest_id=contest_id) }}" class="text-blue-600">Replay the contest on historical prices &rarr;</a></p>
 <div class="bg-white p-6 rounded-lg shadow-md">
+  <p class="text-sm mb-4">Rank by:
+    {% for key, label in [('net_worth', 'Net Worth')] + ranking_keys.items()|list %}
+      {% if key == sort %}<strong>{{ label }}</strong>{% else %}<a href="{{ url_for('leaderboard', contest_id=contest_id, sort=key) }}" class="text-blue-600">{{ label }}</a>{% endif %}{% if not loop.last %} &middot;{% endif %}
+    {% endfor %}
+  </p>
+  {% if my_rank %}
+    <p class="text-lg mb-4"><strong>Your Rank:</strong> {{ my_rank }} of {{ total }}</p>
+  {% endif %}
   <div class="overflow-x-auto">
     <table class="min-w-full divide-y divide-gray-200">
       <thead class="bg-gray-50">
@@ -235,53 +660,377 @@ LEADERBOARD_HTML = """
           <th class="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">Username</th>
           <th class="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">Net Worth</th>
           <th class="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">Returns (%)</th>
+          {% if sort != 'net_worth' %}
+          <th class="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">{{ ranking_keys[sort] }}</th>
+          {% endif %}
         </tr>
       </thead>
       <tbody class="bg-white divide-y divide-gray-200">
         {% for participant in leaderboard %}
         <tr>
-          <td class="px-6 py-4 whitespace-nowrap font-medium text-gray-900">{{ loop.index }}</td>
+          <td class="px-6 py-4 whitespace-nowrap font-medium text-gray-900">{{ participant['rank'] }}</td>
           <td class="px-6 py-4 whitespace-nowrap text-gray-500">{{ participant['username'] }}</td>
           <td class="px-6 py-4 whitespace-nowrap text-gray-500">${{ "{:,.2f}".format(participant['net_worth']) }}</td>
           <td class="px-6 py-4 whitespace-nowrap text-{{ 'green' if participant['returns'] >= 0 else 'red' }}-600 font-semibold">{{ "{:,.2f}".format(participant['returns']) }}%</td>
+          {% if sort != 'net_worth' %}
+          <td class="px-6 py-4 whitespace-nowrap text-gray-500">
+            {% set value = participant['risk'][sort] %}
+            {% if sort == 'var' %}${{ "{:,.2f}".format(value) }}{% elif sort == 'volatility' %}{{ "{:,.2f}".format(value) }}%{% else %}{{ "{:,.2f}".format(value) }}{% endif %}
+          </td>
+          {% endif %}
         </tr>
         {% endfor %}
       </tbody>
     </table>
   </div>
+  {% if top is none and total > per_page %}
+  <div class="flex justify-between mt-4 text-sm">
+    {% if page > 1 %}
+      <a href="{{ url_for('leaderboard', contest_id=contest_id, page=page - 1, per_page=per_page, sort=sort) }}" class="text-blue-600">&larr; Previous</a>
+    {% else %}<span></span>{% endif %}
+    <span class="text-gray-500">Page {{ page }} of {{ ((total - 1) // per_page) + 1 }}</span>
+    {% if page * per_page < total %}
+      <a href="{{ url_for('leaderboard', contest_id=contest_id, page=page + 1, per_page=per_page, sort=sort) }}" class="text-blue-600">Next &rarr;</a>
+    {% else %}<span></span>{% endif %}
+  </div>
+  {% endif %}
 </div>
+{% endblock %}
 """
 
+TEMPLATES = {
+    'login.html': LOGIN_HTML,
+    'base.html': BASE_HTML,
+    'dashboard.html': DASHBOARD_HTML,
+    'portfolio.html': PORTFOLIO_HTML,
+    'contests.html': CONTESTS_HTML,
+    'market_snapshot.html': MARKET_SNAPSHOT_HTML,
+    'contest_card.html': CONTEST_CARD_HTML,
+    'leaderboard.html': LEADERBOARD_HTML,
+    'replay.html': REPLAY_HTML,
+}
+
+# Epoch seconds -> HH:MM:SS (UTC)
+app.jinja_env.filters['clock'] = lambda ts: time.strftime('%H:%M:%S', time.gmtime(ts))
+
+# Compile every template once at startup; Jinja keeps the compiled versions
+app.jinja_loader = DictLoader(TEMPLATES)
+for _name in TEMPLATES:
+    app.jinja_env.get_template(_name)
+
+# --- HTTP Caching ---
+# Part of every ETag, so a template change invalidates what clients hold
+TEMPLATES_VERSION = '%08x' % zlib.crc32(''.join(TEMPLATES[name] for name in sorted(TEMPLATES)).encode('utf-8'))
+
+COMPRESSIBLE_TYPES = ('text/html', 'text/plain', 'application/json')
+
+def state_etag(*state):
+    """ETag for a response fully determined by state (repr-able values). Being
+       derived from the state rather than a per-process counter, it matches
+       across workers."""
+    return hashlib.blake2b(repr((TEMPLATES_VERSION,) + state).encode('utf-8'), digest_size=12).hexdigest()
+
+def conditional_response(etag, render, cache_control='private, no-cache'):
+    """Answers a matching If-None-Match with 304 before anything is rendered;
+       otherwise returns render()'s result. The ETag is weak because the body
+       may be sent under several content encodings."""
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        response = make_response(render())
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+@app.after_request
+def default_cache_control(response):
+    # Pages are per-user and change with every trade; routes that can do better set their own
+    if response.mimetype == 'text/html':
+        response.headers.setdefault('Cache-Control', 'private, no-cache')
+    return response
+
+@app.after_request
+def compress_response(response):
+    """Encodes large text responses with brotli or gzip, whichever the client prefers and we have."""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+    data = response.get_data()
+    if len(data) < app.config['COMPRESS_MIN_SIZE']:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br'] and accepted['br'] >= accepted['gzip']:
+        response.set_data(brotli.compress(data, quality=min(app.config['COMPRESS_LEVEL'], 11)))
+        response.headers['Content-Encoding'] = 'br'
+    elif accepted['gzip']:
+        response.set_data(gzip.compress(data, compresslevel=app.config['COMPRESS_LEVEL']))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
 # --- Helper Functions ---
-def get_stock_price(symbol):
-    """Fetches the current price of a stock using yfinance.
+FRAGMENT_CACHE_SIZE = 512
+_fragment_cache = OrderedDict()  # {(template name, key): Markup}
+_fragment_lock = threading.Lock()
+
+def render_fragment(template_name, key, **context):
+    """Renders a template fragment, reusing the cached HTML while key (a hashable
+       summary of the fragment's inputs) is unchanged."""
+    cache_key = (template_name, key)
+    with _fragment_lock:
+        html = _fragment_cache.get(cache_key)
+        if html is not None:
+            _fragment_cache.move_to_end(cache_key)
+            return html
+
+    html = Markup(render_template(template_name, **context))
+    with _fragment_lock:
+        _fragment_cache[cache_key] = html
+        while len(_fragment_cache) > FRAGMENT_CACHE_SIZE:
+            _fragment_cache.popitem(last=False)
+    return html
+
+# Reloaded in place when the file changes
+symbol_universe = SymbolUniverse(app.config['SYMBOL_UNIVERSE'],
+                                 check_interval=app.config['SYMBOL_UNIVERSE_CHECK_INTERVAL'])
+
+def create_price_provider():
+    """Builds the price source selected by PRICE_PROVIDER."""
+    if app.config['PRICE_PROVIDER'] == 'replay':
+        provider = ReplayProvider(app.config['REPLAY_DIR'])
+        start = provider.timestamps[0]
+        if app.config['REPLAY_START']:
+            start = datetime.datetime.fromisoformat(app.config['REPLAY_START'])
+            start = start.replace(tzinfo=datetime.timezone.utc).timestamp()
+        provider.clock = ReplayClock(float(start), speed=app.config['REPLAY_SPEED'])
+        return provider
+    return YFinanceProvider()
+
+price_provider = create_price_provider()
+
+def fetch_stock_price(symbol):
+    """Fetches the current price of a stock from the price provider, bypassing the cache.
        Returns float price or None if not available."""
-    try:
-        ticker = yf.Ticker(symbol)
-        data = ticker.history(period="1d")
-        if not data.empty:
-            # Take last close
-            return float(data['Close'].iloc[-1])
-    except Exception:
-        pass
-    return None
+    started = time.perf_counter()
+    price = price_provider.fetch(symbol)
+    label = symbol_label(symbol, price)
+    quote_fetch_seconds.observe(time.perf_counter() - started, label)
+    quote_fetches.inc(1, label)
+    if price is None:
+        quote_fetch_errors.inc(1, label)
+    return price
+
+def fetch_stock_prices(symbols):
+    """Fetches the latest price for several stocks in one provider call.
+       Returns {symbol: float price or None}."""
+    started = time.perf_counter()
+    prices = price_provider.fetch_many(symbols)
+    quote_batch_fetch_seconds.observe(time.perf_counter() - started)
+    for symbol, price in prices.items():
+        label = symbol_label(symbol, price)
+        quote_fetches.inc(1, label)
+        if price is None:
+            quote_fetch_errors.inc(1, label)
+    return prices
+
+# Shared by every request thread in this process
+quote_cache = QuoteCache(fetch_stock_price, fetch_many=fetch_stock_prices,
+                         ttl=app.config['QUOTE_CACHE_TTL'],
+                         negative_ttl=app.config['QUOTE_CACHE_NEGATIVE_TTL'],
+                         max_size=app.config['QUOTE_CACHE_MAX_SIZE'])
+
+def quote_cache_metrics():
+    lines = ['# TYPE mockvest_quote_cache_events counter']
+    stats = quote_cache.snapshot_stats()
+    for event in ('hits', 'misses', 'stale', 'negative_hits', 'coalesced', 'errors'):
+        lines.append('mockvest_quote_cache_events{event="%s"} %d' % (event, stats[event]))
+    lines.append('# TYPE mockvest_quote_cache_size gauge')
+    lines.append('mockvest_quote_cache_size %d' % stats['size'])
+    return lines
+
+metrics.add_collector(quote_cache_metrics)
+
+def get_stock_price(symbol, max_age=None):
+    """Returns the current price of a stock, served from the shared quote cache.
+       Returns float price or None if not available."""
+    if not symbol_universe.is_valid(symbol):
+        symbol_rejections.inc()
+        return None
+    if shared_quotes is not None:
+        # Lock-free read of the cross-process table; fall back if missing or too old
+        quote = shared_quotes.read(symbol)
+        limit = app.config['QUOTE_CACHE_TTL'] if max_age is None else max_age
+        if quote is not None and quote[0] is not None and time.time() - quote[1] < limit:
+            return quote[0]
+    return quote_cache.get(symbol, max_age=max_age)
+
+def get_stock_prices(symbols):
+    """Returns {symbol: float price or None} for all symbols with one batched fetch
+       for whatever is not already cached. With the background refresher running
+       this only reads memory; symbols it has not covered yet come back as None."""
+    if quote_refresher is not None:
+        prices = {}
+        for symbol in symbols:
+            quote = quote_cache.peek(symbol)
+            prices[symbol] = quote[0] if quote else None
+        return prices
+    abandoned = g.get('abandoned_quotes', ()) if has_app_context() else ()
+    if not abandoned:
+        return quote_cache.get_many(symbols)
+    # This request already gave up on these (see get_stock_prices_async)
+    prices = quote_cache.get_many([symbol for symbol in symbols if symbol not in abandoned])
+    prices.update((symbol, None) for symbol in symbols if symbol in abandoned)
+    return prices
+
+def get_quote_times(symbols):
+    """Returns {symbol: epoch second the quote was fetched, or None if never fetched}."""
+    now = time.time()
+    times = {}
+    for symbol in symbols:
+        quote = quote_cache.peek(symbol)
+        times[symbol] = int(now - quote[1]) if quote else None
+    return times
+
+def refresher_symbols():
+    """Symbols the background refresher keeps warm: the market snapshot plus every held symbol."""
+    symbols = set(market_symbols)
+    for user_portfolio in list(portfolios.values()):
+        symbols.update(list(user_portfolio))
+    symbols.update(order_engine.symbols())
+    symbols.update(risk_model.symbols())
+    return symbols
+
+shared_quotes = None
+quotes_writer = WriterElection(app.config['SHARED_QUOTES_LOCK'])
+
+_reserved_at = {}  # {symbol: when this worker reserved its shared slot}
+
+def fetch_shared_stock_prices(symbols):
+    """Refresher fetch in shared-quote mode. The elected writer fetches upstream
+       and publishes to the shared table; every other worker copies quotes from
+       the table and reserves slots for symbols not published yet, which the
+       writer fills on its next refresh. A worker only fetches upstream itself
+       when the table is missing or full, or a quote stays unpublished or
+       stale for longer than QUOTE_MAX_STALENESS."""
+    global shared_quotes
+    if quotes_writer.try_acquire():
+        if shared_quotes is None:
+            shared_quotes = SharedQuoteTable.open_or_create(app.config['SHARED_QUOTES_NAME'],
+                                                            app.config['SHARED_QUOTES_SLOTS'])
+        elif not shared_quotes.owner:
+            # Promote the mapping this worker already has rather than mapping the table again
+            shared_quotes.owner = True
+        # Keep every named slot fresh, including ones reserved by other workers
+        prices = fetch_stock_prices(set(symbols) | set(shared_quotes.symbols()))
+        shared_quotes.write_many(prices)
+        return prices
+
+    if shared_quotes is None:
+        shared_quotes = SharedQuoteTable.attach(app.config['SHARED_QUOTES_NAME'])
+    quotes = shared_quotes.read_many(symbols) if shared_quotes is not None else {}
+    unpublished = [symbol for symbol in symbols if symbol not in quotes]
+    reserved = set(shared_quotes.reserve(unpublished)) if shared_quotes is not None else set()
+    now = time.time()
+    max_staleness = app.config['QUOTE_MAX_STALENESS']
+    prices = {}
+    missing = []
+    for symbol in symbols:
+        quote = quotes.get(symbol)
+        if quote is not None and now - quote[1] < max_staleness:
+            prices[symbol] = quote[0]
+        elif symbol in reserved and now - _reserved_at.setdefault(symbol, now) < max_staleness:
+            continue  # the writer publishes it on its next refresh
+        else:
+            missing.append(symbol)
+    if missing:
+        prices.update(fetch_stock_prices(missing))
+    return prices
+
+_fetch_executor = None
+
+async def get_stock_prices_async(symbols):
+    """Like get_stock_prices, but the one batched fetch for uncached symbols
+       runs on a shared thread pool and is awaited for at most
+       ASYNC_FETCH_TIMEOUT, so the event loop keeps serving other requests.
+       Symbols still pending at the timeout come back as None without touching
+       the cache; the fetch finishes in the background and fills it."""
+    global _fetch_executor
+    symbols = list(dict.fromkeys(symbols))
+    if quote_refresher is not None:
+        return get_stock_prices(symbols)
+    prices = quote_cache.get_cached(symbols)
+    missing = []
+    for symbol in symbols:
+        if symbol in prices:
+            continue
+        if symbol_universe.is_valid(symbol):
+            missing.append(symbol)
+        else:
+            symbol_rejections.inc()
+            prices[symbol] = None
+    if missing:
+        if _fetch_executor is None:
+            _fetch_executor = ThreadPoolExecutor(max_workers=app.config['ASYNC_FETCH_CONCURRENCY'],
+                                                 thread_name_prefix='quote-fetch')
+        loop = asyncio.get_running_loop()
+        try:
+            prices.update(await asyncio.wait_for(loop.run_in_executor(_fetch_executor, quote_cache.get_many, missing),
+                                                 app.config['ASYNC_FETCH_TIMEOUT']))
+        except asyncio.TimeoutError:
+            for symbol in missing:
+                async_fetch_timeouts.inc(1, symbol_label(symbol))
+                prices[symbol] = None
+            # Keep the view's own lookups from waiting on the same fetch
+            g.abandoned_quotes = set(missing)
+    return prices
+
+quote_refresher = None
+
+def start_quote_refresher():
+    """Starts the background refresher thread once per process."""
+    global quote_refresher, shared_quotes
+    if quote_refresher is None:
+        fetch_many = fetch_stock_prices
+        if app.config['SHARED_QUOTES']:
+            shared_quotes = SharedQuoteTable.attach(app.config['SHARED_QUOTES_NAME'])
+            fetch_many = fetch_shared_stock_prices
+        quote_refresher = QuoteRefresher(quote_cache, fetch_many, refresher_symbols,
+                                         interval=app.config['QUOTE_REFRESH_INTERVAL'])
+        quote_refresher.start()
+    return quote_refresher
+
+# Columnar copy of `portfolios`, kept in sync by trade_stock and login
+holdings_store = HoldingsStore.from_portfolios(portfolios)
+_valuation_cache = (None, None)  # (key, Valuation)
+
+def portfolio_valuation():
+    """Values every user's holdings at the currently cached prices in one
+       vectorized pass. Reused until holdings or cached prices change."""
+    global _valuation_cache
+    key = (holdings_store.version, quote_cache.version)
+    cached_key, valuation = _valuation_cache
+    if cached_key == key:
+        return valuation
+
+    prices = {}
+    for symbol in holdings_store.symbols:
+        quote = quote_cache.peek(symbol)
+        prices[symbol] = quote[0] if quote else None
+    valuation = holdings_store.valuate(prices)
+    _valuation_cache = (key, valuation)
+    return valuation
 
 def calculate_portfolio_value(username):
-    """Calculates the current value of a user's stock portfolio."""
+    """Calculates the current value of a user's stock portfolio.
+       Holdings without a current price are valued at their purchase_price."""
     user_portfolio = portfolios.get(username, {})
-    total_value = 0.0
     if not user_portfolio:
         return 0.0
 
-    # For reliability we fetch per symbol (safe fallback)
-    for symbol, stock_data in user_portfolio.items():
-        current_price = get_stock_price(symbol)
-        if current_price is None:
-            # fallback to purchase_price if current price not available
-            current_price = float(stock_data.get('purchase_price', 0.0))
-        total_value += stock_data['shares'] * current_price
-
-    return total_value
+    # Make sure the user's quotes are cached, then read the shared valuation
+    get_stock_prices(user_portfolio.keys())
+    return portfolio_valuation().value_of(username)
 
 def calculate_returns(net_worth):
     """Calculates the percentage return based on initial capital."""
@@ -291,6 +1040,224 @@ def calculate_returns(net_worth):
     returns = ((net_worth - initial_capital) / initial_capital) * 100.0
     return returns
 
+def cached_portfolio_value(username):
+    """username's holdings valued at already-cached prices (never hits the network).
+       Reads only username's own positions, so valuing one user stays cheap."""
+    value = 0.0
+    for symbol, shares, cost_basis in holdings_store.positions(username):
+        quote = quote_cache.peek(symbol)
+        value += shares * (quote[0] if quote and quote[0] is not None else cost_basis)
+    return value
+
+def cached_net_worth(username):
+    """Balance plus holdings valued at already-cached prices."""
+    return float(users.get(username, {}).get('balance', 0.0)) + cached_portfolio_value(username)
+
+# Materialized contest rankings, updated on trades, fees and price moves
+leaderboards = LeaderboardBook(cached_net_worth, lambda username: list(portfolios.get(username, {})))
+quote_cache.add_batch_listener(lambda prices: leaderboards.prices_changed(prices))
+
+# One feed of price changes shared by every streaming client
+quote_feed = QuoteFeed()
+quote_cache.add_listener(quote_feed.publish)
+
+# Rolling return statistics; each quote change can close a daily bar
+risk_model = RiskModel(lambda *args: price_provider.history_many(*args), benchmark=app.config['RISK_BENCHMARK'],
+                       window=app.config['RISK_WINDOW'], risk_free_rate=app.config['RISK_FREE_RATE'])
+
+def market_date():
+    """Today's date on the price provider's clock (replay time in replay mode)."""
+    return datetime.datetime.fromtimestamp(price_provider.now(), datetime.timezone.utc).date()
+
+quote_cache.add_listener(lambda symbol, price: risk_model.on_price(symbol, price, market_date()))
+
+def portfolio_risk(username):
+    """Volatility, beta, Sharpe ratio and value-at-risk of username's holdings
+       at cached prices, or None without enough history. Symbols seen for the
+       first time are tracked (one history download each)."""
+    user_portfolio = portfolios.get(username, {})
+    if not user_portfolio:
+        return None
+    quotes = {}
+    for symbol in list(user_portfolio) + [risk_model.benchmark]:
+        quote = quote_cache.peek(symbol)
+        if quote and quote[0] is not None:
+            quotes[symbol] = quote[0]
+    today = market_date()
+    risk_model.track(list(user_portfolio), today, quotes)
+    risk_model.roll(today)
+    values = {symbol: stock_data['shares'] * quotes.get(symbol, stock_data['purchase_price'])
+              for symbol, stock_data in list(user_portfolio.items())}
+    return risk_model.analyze(values)
+
+_risk_rankings = {}  # {(contest_id, key): ((board version, risk version), ContestLeaderboard, {username: risk})}
+
+def risk_ranking(contest_id, key):
+    """Contest participants ranked by a risk metric (see RANKING_KEYS).
+       Rebuilt only when the net-worth board or the risk model has changed."""
+    version = (leaderboards.board(contest_id).version, risk_model.version)
+    cached = _risk_rankings.get((contest_id, key))
+    if cached is not None and cached[0] == version:
+        return cached[1], cached[2]
+
+    board = ContestLeaderboard()
+    risks = {}
+    for uname in list(contests_data[contest_id]['participants']):
+        risks[uname] = portfolio_risk(uname)
+        score = risks[uname][key] if risks[uname] else None
+        if score is not None:
+            # ContestLeaderboard ranks highest first
+            board.update(uname, score if RANKING_KEYS[key] else -score)
+    # Tracking new symbols may have moved the risk model on
+    _risk_rankings[(contest_id, key)] = ((version[0], risk_model.version), board, risks)
+    return board, risks
+
+def rebuild_leaderboards():
+    """Registers every existing contest participant with the leaderboard book."""
+    for contest_id, contest_data in contests_data.items():
+        leaderboards.board(contest_id)
+        for uname in contest_data['participants']:
+            leaderboards.join(contest_id, uname)
+
+rebuild_leaderboards()
+
+# --- Ledger ---
+INITIAL_BALANCE = 100000.0
+
+def apply_ledger_entry(entry):
+    """Materializes one ledger entry into users, portfolios and contests_data."""
+    username = entry['username']
+    kind = entry['kind']
+
+    if kind == 'open':
+        users[username] = {'password_hash': entry['password_hash'], 'balance': entry['amount'], 'contests': []}
+        portfolios[username] = {}
+        holdings_store.add_user(username)
+        return
+    if kind in ('order', 'cancel', 'reject'):
+        order_engine.apply(entry)
+        return
+
+    user_data = users[username]
+    user_portfolio = portfolios[username]
+    symbol = entry['symbol']
+    shares = entry['shares']
+
+    if kind == 'buy':
+        cost = shares * entry['price']
+        user_data['balance'] -= cost
+
+        # Update or add stock to portfolio
+        if symbol in user_portfolio:
+            existing_shares = user_portfolio[symbol]['shares']
+            existing_price = user_portfolio[symbol]['purchase_price']
+
+            # Calculate new average price
+            new_total_cost = (existing_shares * existing_price) + cost
+            new_total_shares = existing_shares + shares
+
+            user_portfolio[symbol]['shares'] = new_total_shares
+            user_portfolio[symbol]['purchase_price'] = new_total_cost / new_total_shares
+        else:
+            user_portfolio[symbol] = {'shares': shares, 'purchase_price': entry['price']}
+
+    elif kind == 'sell':
+        user_data['balance'] += shares * entry['price']
+        user_portfolio[symbol]['shares'] -= shares
+
+        if user_portfolio[symbol]['shares'] == 0:
+            del user_portfolio[symbol]
+
+    elif kind == 'fee':
+        contest_id = entry['contest_id']
+        user_data['balance'] -= entry['amount']
+        contests_data[contest_id]['participants'].append(username)
+        user_data.setdefault('contests', []).append(contest_id)
+        leaderboards.join(contest_id, username)
+
+    if symbol is not None:
+        position = user_portfolio.get(symbol)
+        if position:
+            holdings_store.set_holding(username, symbol, position['shares'], position['purchase_price'])
+        else:
+            holdings_store.set_holding(username, symbol, 0, 0.0)
+    if entry.get('order_id') is not None:
+        order_engine.apply(entry)
+    leaderboards.user_changed(username)
+
+if app.config['DATABASE']:
+    storage = SQLiteStorage(app.config['DATABASE'], apply_ledger_entry)
+else:
+    storage = MemoryStorage(apply_ledger_entry)
+
+# Trades, fees and registrations are serialized per user, never globally
+trade_engine = TradeEngine(storage,
+                           lambda username: (users[username], portfolios[username]),
+                           lambda symbol: get_stock_price(symbol, max_age=app.config['QUOTE_MAX_STALENESS']),
+                           clock=lambda: price_provider.now())
+
+def count_trades(entries):
+    for entry in entries:
+        trades_total.inc(1, entry['kind'])
+
+def fill_resting_order(order, price, check):
+    """Executes a triggered order like a market order, at the triggering price."""
+    entries = trade_engine.submit(order['username'],
+                                  [{'action': order['action'], 'symbol': order['symbol'], 'shares': order['shares']}],
+                                  prices={order['symbol']: price}, check=check, order_id=order['id'])
+    count_trades(entries)
+
+# Resting limit/stop orders are ledger entries too, and fire on every quote change
+order_engine = OrderEngine(trade_engine.execute, fill_resting_order, clock=lambda: price_provider.now())
+quote_cache.add_listener(order_engine.on_price)
+order_watcher = None
+
+# Catch up with the ledger once everything apply_ledger_entry touches exists
+storage.sync()
+
+def streaming_enabled():
+    """Live updates need prices that move on their own, so /stream is only
+       served when the quote refresher is configured."""
+    return app.config['QUOTE_REFRESHER'] or app.config['SHARED_QUOTES']
+
+# Held by each open /stream response; see STREAM_MAX_CLIENTS
+stream_slots = threading.BoundedSemaphore(app.config['STREAM_MAX_CLIENTS'])
+
+def start_background_tasks():
+    """Starts this process's threads. Threads do not survive fork(), so a
+       preloaded master leaves this to each worker."""
+    global order_watcher
+    if profiler is not None:
+        profiler.start()
+    if streaming_enabled():
+        # refresher_symbols() already covers symbols with resting orders
+        start_quote_refresher()
+    elif order_watcher is None:
+        order_watcher = OrderWatcher(order_engine, quote_cache.get_many,
+                                     interval=app.config['ORDER_WATCH_INTERVAL'])
+        order_watcher.start()
+
+def preload():
+    """Does, once in the master, the work every worker would otherwise repeat:
+       imports the modules that are otherwise loaded on first use, so forked
+       workers share their pages copy-on-write. Templates and the symbol
+       universe are already built at import."""
+    import pandas  # noqa: F401
+    import backtest  # noqa: F401
+    if isinstance(price_provider, YFinanceProvider):
+        import yfinance  # noqa: F401
+    # The ledger was read at import; each worker reopens the database after the fork
+    storage.close()
+
+# Start last, once every quote listener is registered
+if not app.config['PRELOAD']:
+    start_background_tasks()
+
+@app.before_request
+def sync_storage():
+    # Pick up trades written by other workers
+    storage.sync()
+
 # --- Flask Routes ---
 
 @app.route('/')
@@ -302,22 +1269,43 @@ def dashboard():
     user_data = users.get(username, {})
 
     balance = float(user_data.get('balance', 0.0))
+
+    # One round trip for holdings and the market snapshot
+    prices = get_stock_prices(list(portfolios.get(username, {})) + market_symbols)
+
     portfolio_value = calculate_portfolio_value(username)
     net_worth = balance + portfolio_value
 
-    # Market data (robust to None)
-    market_symbols = ['AAPL', 'GOOG', 'MSFT', 'AMZN']
-    market_data = {}
-    for sym in market_symbols:
-        p = get_stock_price(sym)
-        market_data[sym] = p  # p may be float or None; template handles None
-
-    content = render_template_string(DASHBOARD_HTML,
-                                     balance=balance,
-                                     portfolio_value=portfolio_value,
-                                     net_worth=net_worth,
-                                     market_data=market_data)
-    return render_template_string(BASE_HTML, title="Dashboard", content=content, username=username)
+    market_snapshot = render_market_snapshot(prices)
+
+    return render_template('dashboard.html', title="Dashboard", username=username,
+                           balance=balance,
+                           portfolio_value=portfolio_value,
+                           net_worth=net_worth,
+                           market_snapshot=market_snapshot,
+                           live_updates=streaming_enabled(),
+                           stream_busy_retry_ms=app.config['STREAM_BUSY_RETRY_MS'])
+
+def market_snapshot_state(prices):
+    """(symbol, price, quote time) for each market symbol: everything the snapshot shows."""
+    quote_times = get_quote_times(market_symbols)
+    return tuple((sym, prices.get(sym), quote_times[sym]) for sym in market_symbols)
+
+def render_market_snapshot(prices, state=None):
+    state = state or market_snapshot_state(prices)
+    return render_fragment('market_snapshot.html', state,
+                           market_data={sym: price for sym, price, _ in state},
+                           quote_times={sym: quoted_at for sym, _, quoted_at in state})
+
+@app.route('/market_snapshot')
+def market_snapshot():
+    """The dashboard's Market Snapshot on its own, for polling clients. It is
+       the same for every user, so shared caches may keep it briefly."""
+    prices = get_stock_prices(market_symbols)
+    state = market_snapshot_state(prices)
+    return conditional_response(state_etag('market_snapshot', state),
+                                lambda: render_market_snapshot(prices, state),
+                                'public, max-age=%d' % app.config['SNAPSHOT_MAX_AGE'])
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -330,22 +1318,29 @@ def login():
         password = request.form['password']
 
         if mode == 'register':
-            if username in users:
-                error = 'Username already exists. Please choose a different one.'
+            # Hash outside build(), which runs inside the ledger's write transaction
+            password_hash = generate_password_hash(password)
+            def build():
+                if username in users:
+                    raise LedgerError('Username already exists. Please choose a different one.')
+                return [ledger_entry(username, 'open', amount=INITIAL_BALANCE, password_hash=password_hash,
+                                     ts=price_provider.now())]
+            try:
+                trade_engine.execute(username, build)
+            except LedgerError as e:
+                error = str(e)
             else:
-                users[username] = {'password': password, 'balance': 100000.0, 'contests': []}
-                portfolios[username] = {}
                 session['username'] = username
                 return redirect(url_for('dashboard'))
         elif mode == 'login':
             user = users.get(username)
-            if user and user['password'] == password:
+            if user and check_password_hash(user['password_hash'], password):
                 session['username'] = username
                 return redirect(url_for('dashboard'))
             else:
                 error = 'Invalid username or password.'
 
-    return render_template_string(LOGIN_HTML, error=error, mode=mode)
+    return render_template('login.html', error=error, mode=mode)
 
 @app.route('/logout')
 def logout():
@@ -363,10 +1358,12 @@ def portfolio():
 
     user_portfolio = portfolios.get(username, {})
     holdings = {}
+    # The benchmark quote is what closes its daily bars for the risk model
+    prices = get_stock_prices(list(user_portfolio) + [risk_model.benchmark])
 
     # Build holdings with current prices and total values
     for symbol, stock_data in user_portfolio.items():
-        current_price = get_stock_price(symbol)
+        current_price = prices.get(symbol)
         if current_price is None:
             current_price = float(stock_data.get('purchase_price', 0.0))
         total_value = stock_data['shares'] * current_price
@@ -376,62 +1373,92 @@ def portfolio():
             'total_value': total_value
         }
 
-    content = render_template_string(PORTFOLIO_HTML, balance=balance, holdings=holdings)
-    return render_template_string(BASE_HTML, title="My Portfolio", content=content, username=username)
+    valuation = portfolio_valuation()
+    return render_template('portfolio.html', title="My Portfolio", username=username,
+                           balance=balance, holdings=holdings,
+                           unrealized_pnl=valuation.pnl_of(username),
+                           unrealized_returns=valuation.returns_of(username),
+                           risk=portfolio_risk(username),
+                           benchmark=risk_model.benchmark,
+                           open_orders=order_engine.orders_for(username, status='open'),
+                           order_labels=ORDER_LABELS)
 
 @app.route('/trade_stock', methods=['POST'])
 def trade_stock():
     if 'username' not in session:
         return redirect(url_for('login'))
 
+    username = session['username']
+    order = {'symbol': request.form['symbol'],
+             'shares': request.form['shares'],
+             'action': request.form['action']}
+
+    # Trades always execute against a reasonably fresh quote
+    try:
+        entries = trade_engine.submit(username, [order])
+    except LedgerError as e:
+        return str(e), 400
+    count_trades(entries)
+
+    return redirect(url_for('portfolio'))
+
+@app.route('/place_order', methods=['POST'])
+def place_order():
+    """Places a resting limit-buy, limit-sell, stop-loss or take-profit order."""
+    if 'username' not in session:
+        return redirect(url_for('login'))
+
     username = session['username']
     symbol = request.form['symbol'].strip().upper()
     try:
         shares = int(request.form['shares'])
+        trigger = float(request.form['trigger_price'])
     except Exception:
-        return "Invalid number of shares.", 400
-    action = request.form['action']
+        return "Invalid number of shares or trigger price.", 400
 
     current_price = get_stock_price(symbol)
     if current_price is None:
         return "Invalid stock symbol or price not available.", 400
 
-    user_data = users.get(username)
-    user_portfolio = portfolios.get(username)
-
-    if action == 'buy':
-        cost = shares * current_price
-        if user_data['balance'] >= cost:
-            user_data['balance'] -= cost
+    try:
+        order_engine.place(username, symbol, request.form['order_type'], shares, trigger)
+    except OrderError as e:
+        return str(e), 400
 
-            # Update or add stock to portfolio
-            if symbol in user_portfolio:
-                existing_shares = user_portfolio[symbol]['shares']
-                existing_price = user_portfolio[symbol]['purchase_price']
+    # Fill right away if the current price already crosses the trigger
+    order_engine.on_price(symbol, current_price)
+    return redirect(url_for('portfolio'))
 
-                # Calculate new average price
-                new_total_cost = (existing_shares * existing_price) + cost
-                new_total_shares = existing_shares + shares
+@app.route('/cancel_order/<int:order_id>', methods=['POST'])
+def cancel_order(order_id):
+    if 'username' not in session:
+        return redirect(url_for('login'))
 
-                user_portfolio[symbol]['shares'] = new_total_shares
-                user_portfolio[symbol]['purchase_price'] = new_total_cost / new_total_shares
-            else:
-                user_portfolio[symbol] = {'shares': shares, 'purchase_price': current_price}
-        else:
-            return "Insufficient balance.", 400
+    try:
+        order_engine.cancel(session['username'], order_id)
+    except OrderError as e:
+        return str(e), 400
+    return redirect(url_for('portfolio'))
 
-    elif action == 'sell':
-        if symbol not in user_portfolio or user_portfolio[symbol]['shares'] < shares:
-            return "Insufficient shares to sell.", 400
+@app.route('/trade_batch', methods=['POST'])
+def trade_batch():
+    """Fills a JSON list of orders atomically: all of them or none."""
+    if 'username' not in session:
+        return redirect(url_for('login'))
 
-        revenue = shares * current_price
-        user_data['balance'] += revenue
-        user_portfolio[symbol]['shares'] -= shares
+    orders = request.get_json(silent=True)
+    if not isinstance(orders, list) or not all(isinstance(order, dict) for order in orders):
+        return "Expected a JSON list of orders.", 400
 
-        if user_portfolio[symbol]['shares'] == 0:
-            del user_portfolio[symbol]
+    try:
+        entries = trade_engine.submit(session['username'], orders)
+    except LedgerError as e:
+        return jsonify({'error': str(e)}), 400
+    count_trades(entries)
 
-    return redirect(url_for('portfolio'))
+    return jsonify({'filled': [{'action': entry['kind'], 'symbol': entry['symbol'],
+                                'shares': entry['shares'], 'price': entry['price']}
+                               for entry in entries]})
 
 # Renamed route function to avoid shadowing the contests_data variable
 @app.route('/contests')
@@ -440,8 +1467,21 @@ def contests_page():
         return redirect(url_for('login'))
 
     username = session['username']
-    content = render_template_string(CONTESTS_HTML, contests=contests_data, username=username)
-    return render_template_string(BASE_HTML, title="Contests", content=content, username=username)
+    cards = []
+    for contest_id, contest_data in contests_data.items():
+        joined = username in contest_data['participants']
+        key = (contest_id, contest_data['name'], contest_data['entry_fee'],
+               len(contest_data['participants']), joined)
+        cards.append((key, contest_id, contest_data, joined))
+
+    def render():
+        contest_cards = [render_fragment('contest_card.html', key, contest_id=contest_id,
+                                         contest_data=contest_data, joined=joined)
+                         for key, contest_id, contest_data, joined in cards]
+        return render_template('contests.html', title="Contests", username=username,
+                               contest_cards=contest_cards)
+
+    return conditional_response(state_etag('contests', username, [card[0] for card in cards]), render)
 
 @app.route('/join_contest/<contest_id>', methods=['POST'])
 def join_contest(contest_id):
@@ -450,20 +1490,14 @@ def join_contest(contest_id):
 
     username = session['username']
     contest_data = contests_data.get(contest_id)
-    user_data = users.get(username)
 
     if not contest_data:
         return "Contest not found.", 404
 
-    if username in contest_data['participants']:
-        return "You have already joined this contest.", 400
-
-    entry_fee = contest_data['entry_fee']
-    if user_data['balance'] < entry_fee:
-        return "Insufficient balance to join the contest.", 400
-
-    user_data['balance'] -= entry_fee
-    contest_data['participants'].append(username)
+    try:
+        trade_engine.pay_fee(username, contest_id, contest_data)
+    except LedgerError as e:
+        return str(e), 400
 
     return redirect(url_for('contests_page'))
 
@@ -476,27 +1510,236 @@ def leaderboard(contest_id):
     if not contest_data:
         return "Contest not found.", 404
 
-    leaderboard_data = []
-    for uname in contest_data['participants']:
-        user_data = users.get(uname, {})
-        balance = float(user_data.get('balance', 0.0))
-        portfolio_value = calculate_portfolio_value(uname)
-        net_worth = balance + portfolio_value
-        returns_pct = calculate_returns(net_worth)
+    username = session['username']
+    try:
+        page = max(int(request.args.get('page', 1)), 1)
+        per_page = min(max(int(request.args.get('per_page', 50)), 1), 500)
+        top = int(request.args['top']) if 'top' in request.args else None
+    except ValueError:
+        return "Invalid page parameters.", 400
+    sort = request.args.get('sort', 'net_worth')
+    if sort != 'net_worth' and sort not in RANKING_KEYS:
+        return "Invalid ranking key.", 400
+
+    # Refreshing the contest's symbols re-scores only holders whose prices moved
+    get_stock_prices(leaderboards.contest_symbols(contest_id))
+
+    board = leaderboards.board(contest_id)
+    risks = {}
+    if sort != 'net_worth':
+        board, risks = risk_ranking(contest_id, sort)
+    if top is not None:
+        rows = board.top(max(top, 0))
+        page, per_page = 1, max(top, 1)
+    else:
+        rows = board.page(page, per_page)
 
+    leaderboard_data = []
+    for rank, uname, score in rows:
+        net_worth = score if sort == 'net_worth' else cached_net_worth(uname)
         leaderboard_data.append({
+            'rank': rank,
             'username': uname,
             'net_worth': net_worth,
-            'returns': returns_pct
+            'returns': calculate_returns(net_worth),
+            'risk': risks.get(uname)
         })
 
-    # Sort the leaderboard by returns in descending order
-    leaderboard_data.sort(key=lambda x: x['returns'], reverse=True)
+    my_rank = board.rank(username)
+    etag = state_etag('leaderboard', username, contest_id, contest_data['name'], sort, page, per_page, top,
+                      my_rank, len(board), leaderboard_data)
+    return conditional_response(etag, lambda: render_template(
+        'leaderboard.html', title="Leaderboard", username=username,
+        contest_id=contest_id,
+        contest_name=contest_data['name'],
+        leaderboard=leaderboard_data,
+        my_rank=my_rank,
+        total=len(board),
+        page=page,
+        per_page=per_page,
+        top=top,
+        sort=sort,
+        ranking_keys=RANKING_LABELS))
+
+
+_contest_history = {}  # {contest_id: (start, end, symbols requested, closes)}
+
+def contest_history(contest_id, symbols, start, end):
+    """Daily closes for symbols over a contest window. Downloaded once per
+       contest and market day; symbols first traded since are fetched on
+       their own and added as columns. Symbols that came back without data
+       are asked for again on the next replay."""
+    import pandas as pd
+    cached = _contest_history.get(contest_id)
+    if cached is None or cached[:2] != (start, end):
+        cached = (start, end, set(), pd.DataFrame())
+    _, _, requested, closes = cached
+    new = sorted(set(symbols) - requested)
+    if new:
+        fetched = price_provider.history_many(new, start, end)
+        if fetched is not None:
+            fetched = fetched.dropna(axis=1, how='all')
+            if not fetched.empty:
+                closes = fetched if closes.empty else closes.join(fetched, how='outer')
+            requested = requested | (set(new) & set(fetched.columns))
+        _contest_history[contest_id] = (start, end, requested, closes)
+    return closes
+
+def replay_contest(contest_id):
+    """Replays every participant's ledger over the contest window on daily closes."""
+    import pandas as pd
+    from backtest import replay
+    contest_data = contests_data[contest_id]
+    participants = list(contest_data['participants'])
+    start = contest_data['start_date']
+    end = min(contest_data['end_date'], market_date())
+
+    entries = storage.entries(participants)
+    symbols = sorted({entry['symbol'] for entry in entries if entry['symbol']})
+    prices = contest_history(contest_id, symbols, start, end) if symbols else None
+    if prices is None or prices.empty:
+        # No holdings (or no history): score cash only, one row per business day
+        prices = pd.DataFrame(index=pd.bdate_range(start, end))
+    return replay(entries, prices, participants, initial_capital=INITIAL_BALANCE), start, end
+
+@app.route('/replay/<contest_id>')
+def contest_replay(contest_id):
+    if 'username' not in session:
+        return redirect(url_for('login'))
+
+    contest_data = contests_data.get(contest_id)
+    if not contest_data:
+        return "Contest not found.", 404
+
+    result, start, end = replay_contest(contest_id)
+    return render_template('replay.html', title="Contest Replay", username=session['username'],
+                           contest_name=contest_data['name'],
+                           start_date=start,
+                           end_date=end,
+                           n_days=len(result.equity),
+                           standings=result.standings())
+
+@app.route('/stream')
+def stream():
+    """Server-Sent Events: pushes price changes for the market snapshot and the
+       user's holdings, plus the recomputed portfolio value and net worth. Each
+       response ends after STREAM_MAX_SECONDS so it never pins a worker thread;
+       the browser reconnects on its own."""
+    if 'username' not in session:
+        return redirect(url_for('login'))
+    if not streaming_enabled():
+        return 'Live updates need MOCKVEST_QUOTE_REFRESHER=1.', 404
+
+    if not stream_slots.acquire(blocking=False):
+        retry_ms = app.config['STREAM_BUSY_RETRY_MS']
+        return Response('retry: %d\n\n' % retry_ms, status=503, mimetype='text/event-stream',
+                        headers={'Retry-After': str(max(retry_ms // 1000, 1)), 'Cache-Control': 'no-cache'})
+
+    username = session['username']
 
-    content = render_template_string(LEADERBOARD_HTML,
-                                     contest_name=contest_data['name'],
-                                     leaderboard=leaderboard_data)
-    return render_template_string(BASE_HTML, title="Leaderboard", content=content, username=session['username'])
+    def events():
+        last = {}
+        deadline = time.monotonic() + app.config['STREAM_MAX_SECONDS']
+        subscription = quote_feed.subscribe(
+            lambda symbol: symbol in market_symbols or symbol in portfolios.get(username, {}))
+        try:
+            yield 'retry: %d\n\n' % app.config['STREAM_RETRY_MS']
+            # Initial snapshot so the page is current as soon as it connects
+            changes = get_stock_prices(market_symbols + list(portfolios.get(username, {})))
+            while True:
+                update = {'quotes': changes} if changes else {}
+                portfolio_value = cached_portfolio_value(username)
+                net_worth = float(users.get(username, {}).get('balance', 0.0)) + portfolio_value
+                for key, value in (('portfolio_value', portfolio_value), ('net_worth', net_worth)):
+                    if last.get(key) != value:
+                        update[key] = last[key] = value
+
+                if update:
+                    yield 'data: %s\n\n' % json.dumps(update)
+                else:
+                    yield ': keep-alive\n\n'
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                changes = subscription.wait(timeout=min(app.config['STREAM_KEEPALIVE'], remaining))
+        finally:
+            quote_feed.unsubscribe(subscription)
+
+    response = Response(stream_with_context(events()), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Runs when the server closes the response, even if events() never started
+    response.call_on_close(stream_slots.release)
+    return response
+
+@app.route('/symbols')
+def symbols():
+    """Autocomplete for the trade forms: listed symbols starting with ?prefix=."""
+    if 'username' not in session:
+        return redirect(url_for('login'))
+
+    prefix = request.args.get('prefix', '').strip().upper()
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), 50)
+    except ValueError:
+        return "Invalid limit.", 400
+    response = jsonify(symbol_universe.search(prefix, limit) if prefix else [])
+    response.headers['Cache-Control'] = 'private, max-age=60'
+    return response
+
+metrics_networks = [ipaddress.ip_network(network.strip(), strict=False)
+                    for network in app.config['METRICS_ALLOW'].split(',') if network.strip()]
+
+def metrics_allowed():
+    """True if this request may read the metrics endpoints."""
+    token = app.config['METRICS_TOKEN']
+    if token:
+        scheme, _, supplied = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() == 'bearer' and hmac.compare_digest(supplied.strip().encode(), token.encode()):
+            return True
+    try:
+        address = ipaddress.ip_address(request.remote_addr or '')
+    except ValueError:
+        return False
+    return any(address in network for network in metrics_networks)
+
+@app.route('/metrics')
+def metrics_page():
+    """Prometheus text exposition of this worker's metrics."""
+    if not metrics_allowed():
+        return "Forbidden.", 403
+    return metrics.expose(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8',
+                                   'Cache-Control': 'no-store'}
+
+@app.route('/metrics/slowest')
+def slowest_requests():
+    """Sampled stacks of the slowest requests (MOCKVEST_PROFILE_SLOWEST > 0)."""
+    if not metrics_allowed():
+        return "Forbidden.", 403
+    if profiler is None:
+        return "Profiler disabled; set MOCKVEST_PROFILE_SLOWEST.", 404
+    return profiler.dump(), 200, {'Content-Type': 'text/plain; charset=utf-8'}
+
+
+# --- Async Views ---
+
+def prefetched(view, symbols_for):
+    """Async variant of view: awaits symbols_for(username, **view_args) with
+       get_stock_prices_async, then runs view, whose own lookups now hit the cache."""
+    async def async_view(**view_args):
+        if 'username' in session:
+            await get_stock_prices_async(symbols_for(session['username'], **view_args))
+        return view(**view_args)
+    async_view.__name__ = view.__name__
+    async_view.__doc__ = view.__doc__
+    return async_view
+
+if app.config['ASYNC_VIEWS']:
+    app.view_functions['dashboard'] = prefetched(
+        dashboard, lambda username: list(portfolios.get(username, {})) + market_symbols)
+    app.view_functions['portfolio'] = prefetched(
+        portfolio, lambda username: list(portfolios.get(username, {})) + [risk_model.benchmark])
+    app.view_functions['leaderboard'] = prefetched(
+        leaderboard, lambda username, contest_id: leaderboards.contest_symbols(contest_id))
 
 
 # --- Run the App ---
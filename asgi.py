@@ -0,0 +1,17 @@
+"""ASGI entry point, e.g.
+
+    uvicorn asgi:application --workers 4
+
+Serves the same Flask app as the WSGI entry point (gunicorn app:app) with
+async views enabled unless MOCKVEST_ASYNC_VIEWS says otherwise. Each request
+runs on a pool of MOCKVEST_ASGI_THREADS threads, so slow requests and open
+/stream connections overlap instead of queueing behind each other."""
+import os
+
+os.environ.setdefault('MOCKVEST_ASYNC_VIEWS', '1')
+
+from a2wsgi import WSGIMiddleware  # noqa: E402
+
+from app import app  # noqa: E402
+
+application = WSGIMiddleware(app, workers=int(os.environ.get('MOCKVEST_ASGI_THREADS', 32)))
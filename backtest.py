@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+
+
+class ReplayResult:
+    """Per-participant results of a contest replay.
+
+    equity is a dates x users DataFrame; returns (%), max_drawdown (%) and
+    rank are Series indexed by username."""
+
+    def __init__(self, equity, initial):
+        self.equity = equity
+        self.initial = initial
+        self.daily_returns = equity.pct_change().fillna(0.0)
+        final = equity.iloc[-1] if len(equity) else pd.Series(dtype=float)
+        self.returns = (final / initial - 1.0) * 100.0
+        values = equity.to_numpy()
+        peaks = np.maximum.accumulate(values, axis=0) if len(values) else values
+        with np.errstate(divide='ignore', invalid='ignore'):
+            drawdowns = np.where(peaks > 0, values / peaks - 1.0, 0.0)
+        self.max_drawdown = pd.Series(drawdowns.min(axis=0) * 100.0 if len(values) else [],
+                                      index=equity.columns, dtype=float)
+        self.rank = final.rank(ascending=False, method='min').astype(int)
+
+    def standings(self):
+        """Rows of {'rank', 'username', 'net_worth', 'returns', 'max_drawdown'} ordered by rank."""
+        rows = [{'rank': int(self.rank[username]), 'username': username,
+                 'net_worth': float(self.equity[username].iloc[-1]),
+                 'returns': float(self.returns[username]),
+                 'max_drawdown': float(self.max_drawdown[username])}
+                for username in self.equity.columns]
+        rows.sort(key=lambda row: (row['rank'], row['username']))
+        return rows
+
+
+def replay(entries, prices, participants, initial_capital=100000.0):
+    """Replays ledger entries against a price matrix.
+
+    entries: ledger entries (dicts with ts, username, kind, symbol, shares,
+        price, amount); entries dated before the first price date count as
+        opening positions.
+    prices: DataFrame of closes, one row per date and one column per symbol.
+        Positions in a symbol with no closes at all are valued at its last
+        traded price in the ledger.
+    participants: usernames to score.
+
+    Every participant's equity curve is computed with array operations over
+    dates x (user, symbol) positions; there is no per-day or per-user loop."""
+    participants = list(participants)
+    dates = pd.DatetimeIndex(prices.index).normalize()
+    prices = prices.copy()
+    prices.index = dates
+    prices = prices.sort_index().dropna(axis=1, how='all').ffill().bfill()
+
+    users = {username: i for i, username in enumerate(participants)}
+    ledger = pd.DataFrame([e for e in entries if e['username'] in users],
+                          columns=['ts', 'username', 'kind', 'symbol', 'shares', 'price', 'amount'])
+    n_days, n_users = len(dates), len(participants)
+    if n_days == 0:
+        return ReplayResult(pd.DataFrame(columns=participants, dtype=float), pd.Series(dtype=float))
+
+    # Day on which each entry takes effect (first day if it predates the window)
+    entry_days = pd.to_datetime(ledger['ts'], unit='s').dt.normalize()
+    day_idx = np.clip(dates.searchsorted(entry_days, side='left'), 0, n_days - 1)
+    if len(ledger):
+        day_idx = np.where(entry_days.to_numpy() > dates[-1].to_datetime64(), n_days, day_idx)
+    user_idx = ledger['username'].map(users).to_numpy(dtype=np.int64)
+    kind = ledger['kind'].to_numpy()
+    symbol = ledger['symbol'].to_numpy()
+    shares = ledger['shares'].to_numpy(dtype=np.float64)
+    price = ledger['price'].to_numpy(dtype=np.float64)
+    trade_value = shares * price
+    amount = ledger['amount'].to_numpy(dtype=np.float64)
+    in_window = day_idx < n_days
+
+    # Cash: opening deposits, minus buys and fees, plus sells
+    cash_delta = np.select([kind == 'open', kind == 'buy', kind == 'sell', kind == 'fee'],
+                           [amount, -trade_value, trade_value, -amount], 0.0)
+    # Accounts opened after the window are scored as untouched starting capital
+    opened = in_window & (kind == 'open')
+    initial = np.bincount(user_idx[opened], weights=amount[opened], minlength=n_users)
+    has_open = np.bincount(user_idx[opened], minlength=n_users) > 0
+    initial = np.where(has_open, initial, initial_capital)
+    cash = np.zeros((n_days, n_users))
+    np.add.at(cash, (day_idx[in_window], user_idx[in_window]), cash_delta[in_window])
+    cash[0] += np.where(has_open, 0.0, initial_capital)
+    cash = cash.cumsum(axis=0)
+
+    # Holdings: one column per (user, symbol) pair that ever traded
+    trades = in_window & np.isin(kind, ('buy', 'sell'))
+    pair_codes, pairs = pd.factorize(pd.MultiIndex.from_arrays([user_idx[trades], symbol[trades]]))
+    holdings_value = np.zeros((n_days, n_users))
+    if len(pairs):
+        signed = np.where(kind[trades] == 'buy', shares[trades], -shares[trades])
+        positions = np.zeros((n_days, len(pairs)))
+        np.add.at(positions, (day_idx[trades], pair_codes), signed)
+        positions = positions.cumsum(axis=0)
+        pair_users = pairs.get_level_values(0).to_numpy(dtype=np.int64)
+        pair_symbols = pairs.get_level_values(1)
+        pair_prices = prices.reindex(columns=pair_symbols).to_numpy(dtype=np.float64)
+        unpriced = ~pair_symbols.isin(prices.columns)
+        if unpriced.any():
+            # No closes for these symbols: carry each one's last traded price forward
+            traded = pd.DataFrame({'day': day_idx[trades], 'symbol': symbol[trades], 'price': price[trades]})
+            last_traded = traded.groupby(['day', 'symbol'])['price'].last().unstack().reindex(range(n_days))
+            pair_prices[:, unpriced] = (last_traded.ffill().reindex(columns=pair_symbols[unpriced])
+                                        .fillna(0.0).to_numpy(dtype=np.float64))
+        pair_values = positions * pair_prices
+        # Sum pair columns into their users: group columns by user, then reduce each group
+        order = np.argsort(pair_users, kind='stable')
+        grouped_users, starts = np.unique(pair_users[order], return_index=True)
+        holdings_value[:, grouped_users] = np.add.reduceat(pair_values[:, order], starts, axis=1)
+
+    equity = pd.DataFrame(cash + holdings_value, index=dates, columns=participants)
+    return ReplayResult(equity, pd.Series(initial, index=participants))
@@ -0,0 +1,121 @@
+"""Check that the ASGI entry point serves concurrent requests in parallel.
+
+Sends N simultaneous dashboard requests straight into the ASGI application
+(no server or sockets involved), with every quote lookup slowed down to
+`--latency-ms` and the quote cache disabled so each request pays it. If the
+adapter runs requests on a thread pool they finish together after about one
+latency; if it serializes them they finish one latency apart. Prints each
+request's finish time and the overlap factor (sum of request times / wall
+time, ideally close to N) as JSON.
+
+    python benchmarks/bench_asgi_overlap.py --requests 4 --latency-ms 500
+    python benchmarks/bench_asgi_overlap.py --adapter asgiref   # the old WsgiToAsgi wrapper
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_routes import LatencyPriceProvider, git_commit  # noqa: E402
+from storage import ledger_entry  # noqa: E402
+
+
+def build_application(adapter):
+    if adapter == 'asgiref':
+        from asgiref.wsgi import WsgiToAsgi
+        import app as app_module
+        return app_module, WsgiToAsgi(app_module.app)
+    import app as app_module
+    import asgi
+    return app_module, asgi.application
+
+
+async def get(application, path, cookie, started):
+    """One GET through the ASGI interface. Returns (status, seconds since started)."""
+    scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+             'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+             'headers': [(b'host', b'bench'), (b'cookie', cookie.encode())],
+             'client': ('127.0.0.1', 0), 'server': ('bench', 80)}
+    response_complete = asyncio.Event()
+    request_sent = False
+    status = None
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await response_complete.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        elif message['type'] == 'http.response.body' and not message.get('more_body', False):
+            response_complete.set()
+
+    await application(scope, receive, send)
+    return status, time.perf_counter() - started
+
+
+async def run(application, n_requests, cookie):
+    started = time.perf_counter()
+    results = await asyncio.gather(*[get(application, '/', cookie, started) for _ in range(n_requests)])
+    return results, time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=4, help='simultaneous requests')
+    parser.add_argument('--latency-ms', type=float, default=500.0, help='injected price-fetch latency')
+    parser.add_argument('--adapter', choices=('asgi', 'asgiref'), default='asgi',
+                        help="'asgi' is asgi.application; 'asgiref' wraps the app in asgiref's WsgiToAsgi")
+    parser.add_argument('--async-views', action='store_true')
+    parser.add_argument('--output', help='write the JSON report here as well as to stdout')
+    args = parser.parse_args(argv)
+
+    # Every request must fetch, so disable the cache; benchmarks always run in memory
+    os.environ['MOCKVEST_QUOTE_CACHE_TTL'] = '0'
+    os.environ['MOCKVEST_QUOTE_CACHE_NEGATIVE_TTL'] = '0'
+    os.environ.pop('MOCKVEST_DATABASE', None)
+    os.environ.pop('MOCKVEST_QUOTE_REFRESHER', None)
+    os.environ.pop('MOCKVEST_SHARED_QUOTES', None)
+    os.environ['MOCKVEST_ASYNC_VIEWS'] = '1' if args.async_views else '0'
+    os.environ['MOCKVEST_ASGI_THREADS'] = str(max(args.requests, 1))
+    app_module, application = build_application(args.adapter)
+    app_module.price_provider = LatencyPriceProvider(args.latency_ms / 1000.0)
+
+    app_module.storage.execute(lambda: [ledger_entry('bench', 'open', amount=app_module.INITIAL_BALANCE,
+                                                     password_hash=app_module.generate_password_hash('pw'))])
+    flask_app = app_module.app
+    cookie = '%s=%s' % (flask_app.config['SESSION_COOKIE_NAME'],
+                        flask_app.session_interface.get_signing_serializer(flask_app).dumps({'username': 'bench'}))
+
+    results, wall = asyncio.run(run(application, args.requests, cookie))
+    finished = sorted(seconds for _, seconds in results)
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'timestamp': time.time(),
+        'config': vars(args),
+        'statuses': sorted(status for status, _ in results),
+        'finished_seconds': finished,
+        'wall_seconds': wall,
+        # ~requests when they run in parallel, ~1 when they are serialized
+        'overlap': sum(finished) / wall if wall > 0 else None,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
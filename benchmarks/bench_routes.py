@@ -0,0 +1,209 @@
+"""Load-test the MockVest Flask routes at synthetic scale.
+
+Seeds users, holdings and contest participants, swaps the price source for
+a local fake with injected latency, drives the routes through the Flask test
+client and prints throughput and p50/p95/p99 latency as JSON.
+
+    python benchmarks/bench_routes.py --users 10000 --holdings 20 --participants 1000 \\
+        --latency-ms 5 --requests 200 --concurrency 8 --output bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from price_providers import PriceProvider  # noqa: E402
+from storage import ledger_entry  # noqa: E402
+
+
+class LatencyPriceProvider(PriceProvider):
+    """Deterministic fake prices; every call (single or batched) sleeps `latency` seconds."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+
+    def price_for(self, symbol):
+        return 10.0 + (sum(map(ord, symbol)) % 490)
+
+    def fetch(self, symbol):
+        self.calls += 1
+        time.sleep(self.latency)
+        return self.price_for(symbol)
+
+    def fetch_many(self, symbols):
+        self.calls += 1
+        time.sleep(self.latency)
+        return {symbol: self.price_for(symbol) for symbol in symbols}
+
+    def history(self, symbol, start, end):
+        import numpy as np
+        import pandas as pd
+        dates = pd.bdate_range(start, end)
+        # Deterministic walk ending at today's price, so risk metrics have something to chew on
+        rng = np.random.default_rng(sum(map(ord, symbol)))
+        walk = np.exp(np.cumsum(rng.normal(0.0, 0.01, len(dates))[::-1]))[::-1]
+        return pd.Series(self.price_for(symbol) * walk, index=dates)
+
+    def history_many(self, symbols, start, end):
+        self.calls += 1
+        time.sleep(self.latency)
+        return super().history_many(symbols, start, end)
+
+
+def seed(app_module, n_users, n_holdings, n_participants, n_symbols, rng):
+    """Writes synthetic registrations, buys and contest fees through the ledger."""
+    symbols = ['S%04d' % i for i in range(n_symbols)]
+    provider = app_module.price_provider
+    password_hash = app_module.generate_password_hash('pw')
+    entries = []
+    for i in range(n_users):
+        username = 'user%d' % i
+        entries.append(ledger_entry(username, 'open', amount=app_module.INITIAL_BALANCE,
+                                    password_hash=password_hash))
+        for symbol in rng.sample(symbols, min(n_holdings, n_symbols)):
+            entries.append(ledger_entry(username, 'buy', symbol=symbol, shares=rng.randint(1, 20),
+                                        price=provider.price_for(symbol)))
+    for contest_id, contest_data in app_module.contests_data.items():
+        for i in range(min(n_participants, n_users)):
+            entries.append(ledger_entry('user%d' % i, 'fee', contest_id=contest_id,
+                                        amount=contest_data['entry_fee']))
+    app_module.storage.execute(lambda: entries)
+    return symbols
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_route(app_module, name, make_request, n_requests, concurrency, n_users, rng_seed):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    per_thread = [n_requests // concurrency + (1 if i < n_requests % concurrency else 0)
+                  for i in range(concurrency)]
+
+    def worker(thread_index, count):
+        rng = random.Random(rng_seed + thread_index)
+        client = app_module.app.test_client()
+        local = []
+        for _ in range(count):
+            username = 'user%d' % rng.randrange(n_users)
+            with client.session_transaction() as sess:
+                sess['username'] = username
+            started = time.perf_counter()
+            response = make_request(client, rng)
+            local.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                with lock:
+                    errors[0] += 1
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i, count)) for i, count in enumerate(per_thread)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'route': name,
+        'requests': len(latencies),
+        'errors': errors[0],
+        'seconds': elapsed,
+        'throughput_rps': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--holdings', type=int, default=10, help='holdings per user')
+    parser.add_argument('--participants', type=int, default=500, help='participants per contest')
+    parser.add_argument('--symbols', type=int, default=500, help='size of the symbol universe')
+    parser.add_argument('--latency-ms', type=float, default=5.0, help='injected price-fetch latency')
+    parser.add_argument('--cache-ttl', type=float, default=30.0, help='quote cache TTL (0 disables caching)')
+    parser.add_argument('--requests', type=int, default=200, help='requests per route')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--async-views', action='store_true',
+                        help='serve dashboard, portfolio and leaderboard through the async views')
+    parser.add_argument('--routes', default='dashboard,portfolio,trade_stock,leaderboard')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the JSON report here as well as to stdout')
+    args = parser.parse_args(argv)
+
+    # Configure before importing the app; benchmarks always run in memory
+    os.environ['MOCKVEST_QUOTE_CACHE_TTL'] = str(args.cache_ttl)
+    os.environ.pop('MOCKVEST_DATABASE', None)
+    os.environ.pop('MOCKVEST_QUOTE_REFRESHER', None)
+    os.environ['MOCKVEST_ASYNC_VIEWS'] = '1' if args.async_views else '0'
+    import app as app_module
+
+    provider = LatencyPriceProvider(args.latency_ms / 1000.0)
+    app_module.price_provider = provider
+
+    rng = random.Random(args.seed)
+    seed_started = time.perf_counter()
+    symbols = seed(app_module, args.users, args.holdings, args.participants, args.symbols, rng)
+    seed_seconds = time.perf_counter() - seed_started
+    app_module.quote_cache.invalidate()
+
+    contest_id = next(iter(app_module.contests_data))
+    routes = {
+        'dashboard': lambda client, rng: client.get('/'),
+        'portfolio': lambda client, rng: client.get('/portfolio'),
+        'trade_stock': lambda client, rng: client.post('/trade_stock', data={
+            'symbol': rng.choice(symbols), 'shares': '1', 'action': 'buy'}),
+        'leaderboard': lambda client, rng: client.get('/leaderboard/%s' % contest_id),
+    }
+
+    results = []
+    for name in args.routes.split(','):
+        calls_before = provider.calls
+        result = run_route(app_module, name, routes[name], args.requests, args.concurrency,
+                           args.users, args.seed)
+        result['price_fetches'] = provider.calls - calls_before
+        results.append(result)
+
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'timestamp': time.time(),
+        'config': vars(args),
+        'seed_seconds': seed_seconds,
+        'quote_cache': app_module.quote_cache.snapshot_stats(),
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""Compare worker startup time and memory with and without preloading.
+
+Simulates gunicorn's process model: a master forks N workers, which each
+become ready by serving a few cheap routes. In 'lazy' mode every worker
+imports the app itself after the fork (plain `gunicorn app:app`); in
+'preload' mode the master imports the app, calls app.preload() and freezes
+the GC first (MOCKVEST_PRELOAD=1 with gunicorn.conf.py). 'eager' is lazy
+plus app.preload() in every worker, i.e. importing pandas and yfinance at
+startup as the app used to. Reports per-worker boot time and RSS, PSS and
+USS from /proc (Linux only) as JSON.
+
+    python benchmarks/bench_startup.py --workers 4 --modes lazy,preload,eager --output startup.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+READY_ROUTES = ('/login', '/contests')
+
+
+def memory():
+    """{'rss_kb', 'pss_kb', 'uss_kb'} of this process from /proc/self/smaps_rollup."""
+    fields = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return {'rss_kb': fields['Rss'], 'pss_kb': fields['Pss'],
+            'uss_kb': fields['Private_Clean'] + fields['Private_Dirty']}
+
+
+def boot_worker(mode, app_module):
+    """Everything a worker does between fork and serving its first requests."""
+    started = time.perf_counter()
+    if app_module is None:
+        import app as app_module
+    import_seconds = time.perf_counter() - started
+    if mode == 'eager':
+        app_module.preload()
+    if mode == 'preload':
+        app_module.start_background_tasks()
+
+    client = app_module.app.test_client()
+    with client.session_transaction() as sess:
+        sess['username'] = 'bench'
+    for route in READY_ROUTES:
+        client.get(route)
+    return {'import_seconds': import_seconds, 'boot_seconds': time.perf_counter() - started,
+            'heavy_modules_loaded': [name for name in ('pandas', 'yfinance') if name in sys.modules]}
+
+
+def run_mode(mode, n_workers):
+    """Runs in a fresh interpreter: plays master, forks the workers, collects their reports."""
+    os.environ.pop('MOCKVEST_QUOTE_REFRESHER', None)
+    os.environ.pop('MOCKVEST_SHARED_QUOTES', None)
+    os.environ.pop('MOCKVEST_DATABASE', None)
+    app_module = None
+    master_seconds = 0.0
+    if mode == 'preload':
+        os.environ['MOCKVEST_PRELOAD'] = '1'
+        started = time.perf_counter()
+        import app as app_module
+        app_module.preload()
+        gc.freeze()
+        master_seconds = time.perf_counter() - started
+    master_memory = memory()
+
+    workers = []
+    for _ in range(n_workers):
+        to_master_r, to_master_w = os.pipe()
+        to_worker_r, to_worker_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(to_master_r)
+            os.close(to_worker_w)
+            try:
+                report = boot_worker(mode, app_module)
+                os.write(to_master_w, (json.dumps(report) + '\n').encode())
+                # Measure only once every worker is up, so PSS splits shared pages between all of them
+                os.read(to_worker_r, 1)
+                os.write(to_master_w, (json.dumps(memory()) + '\n').encode())
+            finally:
+                os._exit(0)
+        os.close(to_master_w)
+        os.close(to_worker_r)
+        workers.append((pid, os.fdopen(to_master_r), to_worker_w))
+
+    reports = [json.loads(reader.readline()) for _, reader, _ in workers]
+    for _, _, writer in workers:
+        os.write(writer, b'x')
+    for report, (pid, reader, writer) in zip(reports, workers):
+        report.update(json.loads(reader.readline()))
+        reader.close()
+        os.close(writer)
+        os.waitpid(pid, 0)
+
+    def median(key):
+        return statistics.median(report[key] for report in reports)
+
+    return {
+        'mode': mode,
+        'workers': n_workers,
+        'master_preload_seconds': master_seconds,
+        'master': master_memory,
+        'boot_seconds_p50': median('boot_seconds'),
+        'import_seconds_p50': median('import_seconds'),
+        'worker_rss_kb_p50': median('rss_kb'),
+        'worker_pss_kb_p50': median('pss_kb'),
+        'worker_uss_kb_p50': median('uss_kb'),
+        'total_pss_kb': master_memory['pss_kb'] + sum(report['pss_kb'] for report in reports),
+        'per_worker': reports,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--modes', default='lazy,preload', help='comma-separated: lazy, preload, eager')
+    parser.add_argument('--output', help='write the JSON report here as well as to stdout')
+    parser.add_argument('--run-mode', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_mode:
+        print(json.dumps(run_mode(args.run_mode, args.workers)))
+        return
+
+    # Each mode gets a fresh interpreter so nothing is already imported
+    results = []
+    for mode in args.modes.split(','):
+        output = subprocess.check_output([sys.executable, os.path.abspath(__file__),
+                                          '--run-mode', mode, '--workers', str(args.workers)], cwd=ROOT)
+        results.append(json.loads(output.decode().strip().splitlines()[-1]))
+
+    # Imported here, not at the top: bench_routes pulls in numpy, which would
+    # skew the --run-mode interpreters this file is re-run as
+    from bench_routes import git_commit
+
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'timestamp': time.time(),
+        'config': {'workers': args.workers, 'modes': args.modes},
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+"""gunicorn settings, picked up automatically by `gunicorn app:app`.
+
+MOCKVEST_PRELOAD=1 imports the app once in the master, preloads its heavy
+modules and freezes the garbage collector's view of them before forking,
+so workers boot without importing anything and share those pages
+copy-on-write. Each worker starts its own background threads after the
+fork. Without it, every worker imports the app itself and pandas/yfinance
+load on first use.
+
+Workers are threaded (gthread): a sync worker serves one request at a
+time, so a single open /stream would block it until the worker timeout
+killed it, taking MemoryStorage's accounts with it. Each open stream still
+holds one of the worker's threads, so the app serves at most
+MOCKVEST_STREAM_MAX_CLIENTS of them per worker (half the threads by
+default) and answers the rest with a 503."""
+import gc
+import os
+
+preload_app = os.environ.get('MOCKVEST_PRELOAD', '0') == '1'
+worker_class = os.environ.get('MOCKVEST_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('MOCKVEST_THREADS', 8))
+
+
+def when_ready(server):
+    # Runs in the master once the app is loaded, before any worker is forked
+    if preload_app:
+        import app
+        app.preload()
+        # Keep the collector from writing to (and so un-sharing) preloaded objects
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    if preload_app:
+        import app
+        app.start_background_tasks()
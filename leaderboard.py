@@ -0,0 +1,138 @@
+import threading
+from collections import Counter
+
+from sortedcontainers import SortedList
+
+
+class ContestLeaderboard:
+    """Materialized ranking for one contest, ordered by net worth (highest first).
+
+    Backed by a SortedList so updates, rank lookups and slices are O(log n)."""
+
+    def __init__(self):
+        self._ranked = SortedList()  # [(-net_worth, username)]
+        self._net_worth = {}  # {username: net_worth}
+        self.version = 0
+
+    def __len__(self):
+        return len(self._ranked)
+
+    def __contains__(self, username):
+        return username in self._net_worth
+
+    def update(self, username, net_worth):
+        old = self._net_worth.get(username)
+        if old == net_worth:
+            return
+        if old is not None:
+            self._ranked.remove((-old, username))
+        self._net_worth[username] = net_worth
+        self._ranked.add((-net_worth, username))
+        self.version += 1
+
+    def remove(self, username):
+        old = self._net_worth.pop(username, None)
+        if old is not None:
+            self._ranked.remove((-old, username))
+            self.version += 1
+
+    def rank(self, username):
+        """Returns the 1-based rank of username, or None if not ranked."""
+        net_worth = self._net_worth.get(username)
+        if net_worth is None:
+            return None
+        return self._ranked.index((-net_worth, username)) + 1
+
+    def slice(self, start, stop):
+        """Returns [(rank, username, net_worth)] for ranks start+1 .. stop."""
+        return [(start + i + 1, username, -key)
+                for i, (key, username) in enumerate(self._ranked[start:stop])]
+
+    def top(self, k):
+        return self.slice(0, k)
+
+    def page(self, page, per_page):
+        start = (page - 1) * per_page
+        return self.slice(start, start + per_page)
+
+
+class LeaderboardBook:
+    """Keeps every contest's leaderboard up to date incrementally.
+
+    `net_worth(username)` values a user from already-cached prices. Call
+    user_changed() after a trade or fee, and prices_changed() when quotes
+    move; only the affected participants are re-scored, once per batch."""
+
+    def __init__(self, net_worth, holdings):
+        self._net_worth = net_worth
+        self._holdings = holdings  # callable: username -> iterable of held symbols
+        self._lock = threading.RLock()
+        self._boards = {}  # {contest_id: ContestLeaderboard}
+        self._user_contests = {}  # {username: set(contest_id)}
+        self._user_symbols = {}  # {username: set(symbol)}
+        self._holders = {}  # {symbol: set(username)}, contest participants only
+        self._contest_symbols = {}  # {contest_id: Counter(symbol)}
+
+    def board(self, contest_id):
+        with self._lock:
+            board = self._boards.get(contest_id)
+            if board is None:
+                board = self._boards[contest_id] = ContestLeaderboard()
+                self._contest_symbols[contest_id] = Counter()
+            return board
+
+    def contest_symbols(self, contest_id):
+        """Symbols held by any participant of contest_id."""
+        with self._lock:
+            return [symbol for symbol, n in self._contest_symbols.get(contest_id, {}).items() if n > 0]
+
+    def join(self, contest_id, username):
+        with self._lock:
+            self.board(contest_id)
+            contests = self._user_contests.setdefault(username, set())
+            if contest_id in contests:
+                return
+            contests.add(contest_id)
+            self._contest_symbols[contest_id].update(self._user_symbols.get(username, ()))
+            self.user_changed(username)
+
+    def user_changed(self, username):
+        """Re-scores username everywhere they participate."""
+        with self._lock:
+            contests = self._user_contests.get(username)
+            if not contests:
+                return
+            self._reindex_symbols(username, contests)
+            net_worth = self._net_worth(username)
+            for contest_id in contests:
+                self._boards[contest_id].update(username, net_worth)
+
+    def prices_changed(self, symbols):
+        """Re-scores each participant holding any of symbols exactly once."""
+        with self._lock:
+            affected = set()
+            for symbol in symbols:
+                affected.update(self._holders.get(symbol, ()))
+            for username in affected:
+                net_worth = self._net_worth(username)
+                for contest_id in self._user_contests[username]:
+                    self._boards[contest_id].update(username, net_worth)
+
+    def _reindex_symbols(self, username, contests):
+        new = set(self._holdings(username))
+        old = self._user_symbols.get(username, set())
+        if new == old:
+            return
+        for symbol in old - new:
+            holders = self._holders.get(symbol)
+            if holders is not None:
+                holders.discard(username)
+                if not holders:
+                    del self._holders[symbol]
+        for symbol in new - old:
+            self._holders.setdefault(symbol, set()).add(username)
+        for contest_id in contests:
+            counter = self._contest_symbols[contest_id]
+            counter.subtract(old - new)
+            counter.update(new - old)
+        self._user_symbols[username] = new
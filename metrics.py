@@ -0,0 +1,190 @@
+import bisect
+import heapq
+import sys
+import threading
+import time
+import traceback
+
+# Seconds; tuned for page loads and upstream quote fetches
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs) + '}'
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def expose(self):
+        lines = ['# HELP %s %s' % (self.name, self.documentation), '# TYPE %s counter' % self.name]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append('%s%s %s' % (self.name, _format_labels(self.labelnames, labels), value))
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels."""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}  # {labels: [bucket counts..., +Inf count, sum]}
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def expose(self):
+        lines = ['# HELP %s %s' % (self.name, self.documentation), '# TYPE %s histogram' % self.name]
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series[:-1]):
+                cumulative += count
+                lines.append('%s_bucket%s %d' % (self.name, _format_labels(self.labelnames, labels, [('le', bound)]),
+                                                 cumulative))
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append('%s_sum%s %r' % (self.name, label_text, series[-1]))
+            lines.append('%s_count%s %d' % (self.name, label_text, cumulative))
+        return lines
+
+
+class LabelLimiter:
+    """Caps the distinct values of a label that comes from user input: the
+    first `limit` values admitted get their own series, later ones share
+    `overflow`, so a flood of made-up values cannot grow the exposition."""
+
+    def __init__(self, limit, overflow='other'):
+        self.limit = limit
+        self.overflow = overflow
+        self._lock = threading.Lock()
+        self._admitted = set()
+
+    def __contains__(self, value):
+        return value in self._admitted
+
+    def __call__(self, value):
+        if value in self._admitted:
+            return value
+        with self._lock:
+            if value in self._admitted or len(self._admitted) < self.limit:
+                self._admitted.add(value)
+                return value
+        return self.overflow
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []  # callables returning extra exposition lines
+
+    def counter(self, *args, **kwargs):
+        metric = Counter(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs):
+        metric = Histogram(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def expose(self):
+        """Returns every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.expose())
+        for collector in self._collectors:
+            lines.extend(collector())
+        return '\n'.join(lines) + '\n'
+
+
+class SlowRequestProfiler:
+    """Opt-in sampling profiler that keeps the stacks of the slowest requests.
+
+    A background thread samples the stacks of threads currently serving a
+    request every `interval` seconds. When a request finishes, its samples
+    are kept only if it is among the `keep` slowest seen so far."""
+
+    def __init__(self, keep=10, interval=0.005):
+        self.keep = keep
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._active = {}  # {thread id: [stack samples]}
+        self._slowest = []  # min-heap of (duration, seq, description, samples)
+        self._seq = 0
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='slow-request-profiler', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                active = list(self._active.items())
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for thread_id, samples in active:
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    samples.append(''.join(traceback.format_stack(frame)))
+
+    def begin(self):
+        with self._lock:
+            self._active[threading.get_ident()] = []
+
+    def end(self, duration, description):
+        with self._lock:
+            samples = self._active.pop(threading.get_ident(), [])
+            self._seq += 1
+            item = (duration, self._seq, description, samples)
+            if len(self._slowest) < self.keep:
+                heapq.heappush(self._slowest, item)
+            elif duration > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, item)
+
+    def dump(self):
+        """Text report of the slowest requests, slowest first, with their most common stacks."""
+        with self._lock:
+            slowest = sorted(self._slowest, reverse=True)
+        out = []
+        for duration, _, description, samples in slowest:
+            out.append('=== %s %.1f ms (%d samples)' % (description, duration * 1000, len(samples)))
+            counts = {}
+            for stack in samples:
+                counts[stack] = counts.get(stack, 0) + 1
+            for stack, count in sorted(counts.items(), key=lambda kv: -kv[1])[:3]:
+                out.append('--- %d sample(s)' % count)
+                out.append(stack)
+        return '\n'.join(out) + '\n'
@@ -0,0 +1,253 @@
+import heapq
+import itertools
+import logging
+import math
+import threading
+import time
+
+from storage import LedgerError, ledger_entry
+
+logger = logging.getLogger(__name__)
+
+# order type: (trade action, fires when the price moves 'down' to / 'up' to the trigger)
+ORDER_TYPES = {
+    'limit_buy': ('buy', 'down'),
+    'limit_sell': ('sell', 'up'),
+    'stop_loss': ('sell', 'down'),
+    'take_profit': ('sell', 'up'),
+}
+
+ORDER_LABELS = {
+    'limit_buy': 'Limit Buy',
+    'limit_sell': 'Limit Sell',
+    'stop_loss': 'Stop Loss',
+    'take_profit': 'Take Profit',
+}
+
+
+class OrderError(Exception):
+    """Raised when an order cannot be placed or cancelled."""
+
+
+class _TriggerBook:
+    """Pending orders for one symbol, in two heaps keyed by trigger price.
+
+    `down` orders fire once price <= trigger (highest trigger first), `up`
+    orders once price >= trigger (lowest trigger first). Cancelled orders
+    are dropped lazily when they reach the top of their heap."""
+
+    def __init__(self):
+        self.down = []  # [(-trigger, seq, order_id)]
+        self.up = []  # [(trigger, seq, order_id)]
+        self.open = 0  # orders still open; cancelled ones may linger in the heaps
+
+    def push(self, order, seq):
+        self.open += 1
+        if ORDER_TYPES[order['type']][1] == 'down':
+            heapq.heappush(self.down, (-order['trigger'], seq, order['id']))
+        else:
+            heapq.heappush(self.up, (order['trigger'], seq, order['id']))
+
+    def pop_triggered(self, price, is_open):
+        """Pops and returns the ids of open orders crossed by price."""
+        fired = []
+        while self.down and (-self.down[0][0] >= price or not is_open(self.down[0][2])):
+            order_id = heapq.heappop(self.down)[2]
+            if is_open(order_id):
+                fired.append(order_id)
+        while self.up and (self.up[0][0] <= price or not is_open(self.up[0][2])):
+            order_id = heapq.heappop(self.up)[2]
+            if is_open(order_id):
+                fired.append(order_id)
+        return fired
+
+
+class OrderEngine:
+    """Resting limit, stop-loss and take-profit orders.
+
+    Orders live in the ledger: placing, cancelling, filling and rejecting
+    each write an entry, and apply(entry) materializes them here, so every
+    worker sees the same orders and an order's id (its ledger entry id) is
+    valid in all of them.
+
+    on_price(symbol, price) pops only the orders whose trigger was crossed,
+    O(k log n) for k fills among n open orders, and hands each to `fill`,
+    which executes it exactly like a market order. Several workers may fire
+    the same order; the first fill to commit wins and the others find it
+    closed inside their transaction."""
+
+    def __init__(self, execute, fill, clock=time.time):
+        self._execute = execute  # execute(username, build) -> entries, e.g. TradeEngine.execute
+        # fill(order, price, check) writes the trade with the order's id, calling
+        # check() inside its transaction; raises LedgerError on rejection
+        self._fill = fill
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._books = {}  # {symbol: _TriggerBook}
+        self._orders = {}  # {order_id: order}
+        self._by_user = {}  # {username: [order_id]}
+        self._seq = itertools.count()
+
+    def place(self, username, symbol, order_type, shares, trigger):
+        if order_type not in ORDER_TYPES:
+            raise OrderError("Invalid order type.")
+        if shares <= 0:
+            raise OrderError("Invalid number of shares.")
+        if not math.isfinite(trigger) or trigger <= 0:
+            raise OrderError("Invalid trigger price.")
+        entry, = self._execute(username, lambda: [ledger_entry(username, 'order', symbol=symbol, shares=shares,
+                                                               price=trigger, order_type=order_type,
+                                                               ts=self._clock())])
+        with self._lock:
+            return dict(self._orders[entry['id']])
+
+    def cancel(self, username, order_id):
+        def build():
+            order = self._check_open(order_id, username)
+            return [ledger_entry(username, 'cancel', symbol=order['symbol'], order_id=order_id, ts=self._clock())]
+        self._execute(username, build)
+        with self._lock:
+            return dict(self._orders[order_id])
+
+    def _check_open(self, order_id, username=None):
+        # Runs inside a write transaction, after catching up with the other workers
+        with self._lock:
+            order = self._orders.get(order_id)
+            if order is None or (username is not None and order['username'] != username):
+                raise OrderError("Order not found.")
+            # 'filling' is this worker's own mark; in the ledger the order is still open
+            if order['status'] not in ('open', 'filling'):
+                raise OrderError("Order is no longer open.")
+            return order
+
+    def apply(self, entry):
+        """Materializes a ledger entry: 'order' opens an order; 'cancel',
+           'reject' and trades carrying an order_id close one."""
+        with self._lock:
+            if entry['kind'] == 'order':
+                order = {'id': entry['id'], 'username': entry['username'], 'symbol': entry['symbol'],
+                         'type': entry['order_type'], 'action': ORDER_TYPES[entry['order_type']][0],
+                         'shares': entry['shares'], 'trigger': entry['price'], 'status': 'open',
+                         'created': entry['ts'], 'fill_price': None, 'reason': None}
+                self._orders[order['id']] = order
+                self._by_user.setdefault(order['username'], []).append(order['id'])
+                self._push(order)
+                return
+
+            order = self._orders.get(entry['order_id'])
+            if order is None:
+                return
+            if order['status'] == 'open':
+                # Still in its book here ('filling' orders already left it)
+                self._closed(order['symbol'], 1)
+            if entry['kind'] == 'cancel':
+                order['status'] = 'cancelled'
+            elif entry['kind'] == 'reject':
+                order['status'] = 'rejected'
+                order['reason'] = entry['reason']
+            else:
+                order['status'] = 'filled'
+                order['fill_price'] = entry['price']
+
+    def _push(self, order):
+        book = self._books.get(order['symbol'])
+        if book is None:
+            book = self._books[order['symbol']] = _TriggerBook()
+        book.push(order, next(self._seq))
+
+    def _closed(self, symbol, n):
+        # Drop the book once nothing in it is open, cancelled leftovers included
+        book = self._books[symbol]
+        book.open -= n
+        if book.open == 0:
+            del self._books[symbol]
+
+    def orders_for(self, username, status=None):
+        with self._lock:
+            orders = [dict(self._orders[order_id]) for order_id in self._by_user.get(username, ())]
+        if status is not None:
+            orders = [order for order in orders if order['status'] == status]
+        return orders
+
+    def symbols(self):
+        """Symbols with at least one resting order."""
+        with self._lock:
+            return list(self._books)
+
+    def on_price(self, symbol, price):
+        """Fills every open order on symbol whose trigger price has been crossed."""
+        if price is None:
+            return []
+        with self._lock:
+            book = self._books.get(symbol)
+            if book is None:
+                return []
+            fired = book.pop_triggered(price, lambda order_id: self._orders[order_id]['status'] == 'open')
+            for order_id in fired:
+                self._orders[order_id]['status'] = 'filling'
+            if fired:
+                self._closed(symbol, len(fired))
+            fired = [self._orders[order_id] for order_id in fired]
+
+        # Fill outside the lock; fills take per-user trade locks
+        for order in fired:
+            try:
+                self._fill(order, price, lambda: self._check_open(order['id']))
+            except OrderError:
+                pass  # cancelled or filled by another worker meanwhile
+            except LedgerError as e:
+                self._reject(order, str(e))
+            except Exception:
+                logger.exception("Filling order %s failed", order['id'])
+                self._requeue(order)
+        return fired
+
+    def _reject(self, order, reason):
+        def build():
+            self._check_open(order['id'])
+            return [ledger_entry(order['username'], 'reject', symbol=order['symbol'], order_id=order['id'],
+                                 reason=reason, ts=self._clock())]
+        try:
+            self._execute(order['username'], build)
+        except OrderError:
+            pass
+        except Exception:
+            logger.exception("Rejecting order %s failed", order['id'])
+            self._requeue(order)
+
+    def _requeue(self, order):
+        # Nothing reached the ledger, so the order is still open: put it back
+        # on its book to try again on the next price
+        with self._lock:
+            if order['status'] == 'filling':
+                order['status'] = 'open'
+                self._push(order)
+
+
+class OrderWatcher(threading.Thread):
+    """Background thread that looks up every symbol with a resting order.
+
+    Orders fire from quote changes, so without the quote refresher a symbol
+    nobody is viewing would never be re-priced and its orders never fill.
+    `get_prices(symbols)` should go through the quote cache, whose
+    listeners call on_price when a price moves."""
+
+    def __init__(self, engine, get_prices, interval=15.0):
+        super().__init__(name='order-watcher', daemon=True)
+        self.engine = engine
+        self._get_prices = get_prices
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self.failures = 0
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            symbols = self.engine.symbols()
+            if symbols:
+                try:
+                    self._get_prices(symbols)
+                except Exception:
+                    self.failures += 1
+
+    def stop(self):
+        self._stop_event.set()
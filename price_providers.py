@@ -0,0 +1,206 @@
+import datetime
+import json
+import os
+import time
+
+import numpy as np
+
+# pandas and yfinance are imported where they are used: both are slow to
+# import and most requests never need them (see app.preload)
+
+
+class PriceProvider:
+    """Source of current stock prices.
+
+    fetch(symbol) returns a float price or None; fetch_many(symbols) returns
+    {symbol: price or None}. history(symbol, start, end) returns a pandas
+    Series of daily closes indexed by date. now() is the provider's current
+    time in epoch seconds."""
+
+    def now(self):
+        return time.time()
+
+    def fetch(self, symbol):
+        raise NotImplementedError
+
+    def fetch_many(self, symbols):
+        return {symbol: self.fetch(symbol) for symbol in symbols}
+
+    def history(self, symbol, start, end):
+        raise NotImplementedError
+
+    def history_many(self, symbols, start, end):
+        """Daily closes for several symbols as a dates x symbols DataFrame."""
+        import pandas as pd
+        return pd.DataFrame({symbol: self.history(symbol, start, end) for symbol in symbols})
+
+
+class YFinanceProvider(PriceProvider):
+    """Live prices from Yahoo Finance."""
+
+    def fetch(self, symbol):
+        import yfinance as yf
+        try:
+            ticker = yf.Ticker(symbol)
+            data = ticker.history(period="1d")
+            if not data.empty:
+                # Take last close
+                return float(data['Close'].iloc[-1])
+        except Exception:
+            pass
+        return None
+
+    def fetch_many(self, symbols):
+        """One yf.download for the whole list; symbols missing from the batch
+           fall back to an individual lookup."""
+        import pandas as pd
+        import yfinance as yf
+        symbols = list(symbols)
+        prices = {}
+        try:
+            data = yf.download(symbols, period="1d", progress=False, auto_adjust=False, threads=True)
+            if not data.empty:
+                closes = data['Close']
+                if isinstance(closes, pd.Series):
+                    closes = closes.to_frame(name=symbols[0])
+                for symbol in symbols:
+                    if symbol in closes.columns:
+                        column = closes[symbol].dropna()
+                        if not column.empty:
+                            prices[symbol] = float(column.iloc[-1])
+        except Exception:
+            pass
+
+        for symbol in symbols:
+            if symbol not in prices:
+                prices[symbol] = self.fetch(symbol)
+        return prices
+
+    def history(self, symbol, start, end):
+        import pandas as pd
+        import yfinance as yf
+        try:
+            data = yf.Ticker(symbol).history(start=start, end=end + datetime.timedelta(days=1),
+                                             auto_adjust=False)
+            closes = data['Close'].dropna()
+            closes.index = closes.index.tz_localize(None).normalize()
+            return closes
+        except Exception:
+            return pd.Series(dtype=float)
+
+    def history_many(self, symbols, start, end):
+        """One yf.download for every symbol's daily closes."""
+        import pandas as pd
+        import yfinance as yf
+        symbols = list(symbols)
+        if not symbols:
+            return pd.DataFrame()
+        try:
+            data = yf.download(symbols, start=start, end=end + datetime.timedelta(days=1),
+                               progress=False, auto_adjust=False, threads=True)
+            closes = data['Close']
+            if isinstance(closes, pd.Series):
+                closes = closes.to_frame(name=symbols[0])
+            closes.index = pd.DatetimeIndex(closes.index).tz_localize(None).normalize()
+            return closes.dropna(how='all')
+        except Exception:
+            return super().history_many(symbols, start, end)
+
+
+class ReplayClock:
+    """Replay time: starts at `start` (epoch seconds) and advances `speed`
+    seconds per wall-clock second. speed=0 freezes the clock."""
+
+    def __init__(self, start, speed=1.0, wall_clock=time.time):
+        self.start = start
+        self.speed = speed
+        self._wall_clock = wall_clock
+        self._anchor = wall_clock()
+
+    def now(self):
+        return self.start + (self._wall_clock() - self._anchor) * self.speed
+
+    def set(self, start):
+        self.start = start
+        self._anchor = self._wall_clock()
+
+
+def write_replay_data(directory, symbols, timestamps, close, open_=None, high=None, low=None):
+    """Writes OHLC history in the layout ReplayProvider reads:
+       symbols.json, timestamps.npy (int64 epoch seconds, ascending) and one
+       (len(timestamps), len(symbols)) float64 matrix per field. Missing bars
+       are NaN."""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, 'symbols.json'), 'w') as f:
+        json.dump(list(symbols), f)
+    np.save(os.path.join(directory, 'timestamps.npy'), np.asarray(timestamps, dtype=np.int64))
+    for field, values in (('close', close), ('open', open_), ('high', high), ('low', low)):
+        if values is not None:
+            np.save(os.path.join(directory, field + '.npy'), np.asarray(values, dtype=np.float64))
+
+
+class ReplayProvider(PriceProvider):
+    """Deterministic, network-free prices from local memory-mapped OHLC files
+    (see write_replay_data). The "current" price of a symbol is its last close
+    at or before the replay clock."""
+
+    def __init__(self, directory, clock=None):
+        self.directory = directory
+        with open(os.path.join(directory, 'symbols.json')) as f:
+            self.symbols = json.load(f)
+        self._columns = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.timestamps = np.load(os.path.join(directory, 'timestamps.npy'), mmap_mode='r')
+        self.close = np.load(os.path.join(directory, 'close.npy'), mmap_mode='r')
+        self.clock = clock or ReplayClock(int(self.timestamps[0]), speed=0)
+
+    def now(self):
+        return self.clock.now()
+
+    def _row(self):
+        row = int(np.searchsorted(self.timestamps, self.now(), side='right')) - 1
+        return row if row >= 0 else None
+
+    def _last_close(self, row, column):
+        # Walk back over missing bars (NaN) to the symbol's last traded close
+        values = self.close[:row + 1, column]
+        valid = np.flatnonzero(~np.isnan(values))
+        return float(values[valid[-1]]) if len(valid) else None
+
+    def fetch(self, symbol):
+        column = self._columns.get(symbol)
+        row = self._row()
+        if column is None or row is None:
+            return None
+        price = self.close[row, column]
+        return float(price) if not np.isnan(price) else self._last_close(row, column)
+
+    def fetch_many(self, symbols):
+        symbols = list(symbols)
+        row = self._row()
+        if row is None:
+            return {symbol: None for symbol in symbols}
+        known = [symbol for symbol in symbols if symbol in self._columns]
+        closes = self.close[row, [self._columns[symbol] for symbol in known]]
+        prices = {symbol: None for symbol in symbols}
+        for symbol, price in zip(known, closes):
+            prices[symbol] = float(price) if not np.isnan(price) else self._last_close(row, self._columns[symbol])
+        return prices
+
+    def history(self, symbol, start, end):
+        import pandas as pd
+        column = self._columns.get(symbol)
+        if column is None:
+            return pd.Series(dtype=float)
+        index = pd.to_datetime(np.asarray(self.timestamps), unit='s')
+        closes = pd.Series(np.asarray(self.close[:, column]), index=index).dropna()
+        closes = closes.groupby(closes.index.normalize()).last()
+        return closes.loc[pd.Timestamp(start):pd.Timestamp(end)]
+
+    def history_many(self, symbols, start, end):
+        import pandas as pd
+        columns = [symbol for symbol in symbols if symbol in self._columns]
+        index = pd.to_datetime(np.asarray(self.timestamps), unit='s')
+        closes = pd.DataFrame(np.asarray(self.close[:, [self._columns[s] for s in columns]]),
+                              index=index, columns=columns)
+        closes = closes.groupby(closes.index.normalize()).last()
+        return closes.loc[pd.Timestamp(start):pd.Timestamp(end)].dropna(how='all')
@@ -0,0 +1,233 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class QuoteCache:
+    """Process-wide TTL/LRU cache for stock quotes.
+
+    Concurrent lookups for the same symbol share a single in-flight fetch
+    (single-flight), and failed lookups are remembered for a short negative
+    TTL so bad symbols do not hammer the upstream source."""
+
+    def __init__(self, fetch, fetch_many=None, ttl=30.0, negative_ttl=5.0, max_size=1024, clock=time.monotonic):
+        self._fetch = fetch
+        self._fetch_many = fetch_many
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # {symbol: (price or None, fetched_at)}
+        self._inflight = {}  # {symbol: threading.Event}
+        self._listeners = []  # called as listener(symbol, price) when a price changes
+        self._batch_listeners = []  # called as listener({symbol: price}) once per batch of changes
+        self.version = 0  # bumped whenever a cached price changes or disappears
+        self.stats = {'hits': 0, 'misses': 0, 'stale': 0, 'negative_hits': 0,
+                      'coalesced': 0, 'errors': 0}
+
+    def _is_fresh(self, price, fetched_at, now, max_age=None):
+        if price is None:
+            return now - fetched_at < self.negative_ttl
+        return now - fetched_at < (self.ttl if max_age is None else max_age)
+
+    def get(self, symbol, max_age=None):
+        """Returns the cached price for symbol, fetching it if missing or expired.
+           max_age (seconds) overrides the TTL for callers that need a fresher quote."""
+        while True:
+            with self._lock:
+                now = self._clock()
+                entry = self._entries.get(symbol)
+                if entry is not None:
+                    price, fetched_at = entry
+                    if self._is_fresh(price, fetched_at, now, max_age):
+                        self._entries.move_to_end(symbol)
+                        self.stats['hits' if price is not None else 'negative_hits'] += 1
+                        return price
+                    self.stats['stale'] += 1
+                else:
+                    self.stats['misses'] += 1
+
+                event = self._inflight.get(symbol)
+                if event is None:
+                    # We are the leader: fetch outside the lock
+                    event = threading.Event()
+                    self._inflight[symbol] = event
+                    break
+                self.stats['coalesced'] += 1
+
+            # Another thread is fetching this symbol; wait and re-read
+            event.wait()
+            with self._lock:
+                entry = self._entries.get(symbol)
+                if entry is not None:
+                    return entry[0]
+
+        price = None
+        changed = {}
+        try:
+            price = self._fetch(symbol)
+        except Exception:
+            with self._lock:
+                self.stats['errors'] += 1
+        finally:
+            with self._lock:
+                changed = self._store({symbol: price})
+                self._inflight.pop(symbol, None)
+            event.set()
+        self._notify(changed)
+        return price
+
+    def get_many(self, symbols):
+        """Returns {symbol: price or None}, fetching every missing symbol in one batch."""
+        results = {}
+        leading = []
+        waiting = {}
+        with self._lock:
+            now = self._clock()
+            for symbol in dict.fromkeys(symbols):
+                entry = self._entries.get(symbol)
+                if entry is not None:
+                    price, fetched_at = entry
+                    if self._is_fresh(price, fetched_at, now):
+                        self._entries.move_to_end(symbol)
+                        self.stats['hits' if price is not None else 'negative_hits'] += 1
+                        results[symbol] = price
+                        continue
+                    self.stats['stale'] += 1
+                else:
+                    self.stats['misses'] += 1
+
+                event = self._inflight.get(symbol)
+                if event is None:
+                    self._inflight[symbol] = threading.Event()
+                    leading.append(symbol)
+                else:
+                    self.stats['coalesced'] += 1
+                    waiting[symbol] = event
+
+        if leading:
+            fetched = {}
+            try:
+                if self._fetch_many is not None:
+                    fetched = self._fetch_many(leading)
+                else:
+                    fetched = {symbol: self._fetch(symbol) for symbol in leading}
+            except Exception:
+                with self._lock:
+                    self.stats['errors'] += 1
+            finally:
+                for symbol in leading:
+                    results[symbol] = fetched.get(symbol)
+                with self._lock:
+                    changed = self._store({symbol: results[symbol] for symbol in leading})
+                    events = [self._inflight.pop(symbol) for symbol in leading]
+                # Release waiters before running listeners, which may be slow
+                for event in events:
+                    event.set()
+            self._notify(changed)
+
+        for symbol, event in waiting.items():
+            event.wait()
+            # Like get(): take what the leader just stored, however short the TTL
+            with self._lock:
+                entry = self._entries.get(symbol)
+            results[symbol] = entry[0] if entry is not None else self.get(symbol)
+        return results
+
+    def get_cached(self, symbols):
+        """Returns {symbol: price or None} for the symbols with a fresh entry,
+           positive or negative. Never fetches; the rest are simply left out."""
+        results = {}
+        with self._lock:
+            now = self._clock()
+            for symbol in symbols:
+                entry = self._entries.get(symbol)
+                if entry is not None and self._is_fresh(entry[0], entry[1], now):
+                    self._entries.move_to_end(symbol)
+                    self.stats['hits' if entry[0] is not None else 'negative_hits'] += 1
+                    results[symbol] = entry[0]
+        return results
+
+    def peek(self, symbol):
+        """Returns (price, age_seconds) without fetching, or None if not cached."""
+        with self._lock:
+            entry = self._entries.get(symbol)
+            if entry is None:
+                return None
+            return entry[0], self._clock() - entry[1]
+
+    def put(self, symbol, price, fetched_at=None):
+        """Stores a price (or None for a failed lookup) and evicts the least recently used entries."""
+        self.put_many({symbol: price}, fetched_at)
+
+    def put_many(self, prices, fetched_at=None):
+        """Stores several prices, then notifies listeners once for the whole batch."""
+        with self._lock:
+            changed = self._store(prices, fetched_at)
+        self._notify(changed)
+
+    def _store(self, prices, fetched_at=None):
+        # Caller holds the lock; returns {symbol: price} for the prices that changed
+        fetched_at = self._clock() if fetched_at is None else fetched_at
+        changed = {}
+        for symbol, price in prices.items():
+            previous = self._entries.get(symbol)
+            self._entries[symbol] = (price, fetched_at)
+            self._entries.move_to_end(symbol)
+            if previous is None or previous[0] != price:
+                self.version += 1
+                if price is not None:
+                    changed[symbol] = price
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.version += 1
+        return changed
+
+    def _notify(self, changed):
+        if not changed:
+            return
+        with self._lock:
+            listeners = list(self._listeners)
+            batch_listeners = list(self._batch_listeners)
+        for symbol, price in changed.items():
+            for listener in listeners:
+                try:
+                    listener(symbol, price)
+                except Exception:
+                    logger.exception("Quote listener failed for %s", symbol)
+        for listener in batch_listeners:
+            try:
+                listener(changed)
+            except Exception:
+                logger.exception("Quote batch listener failed")
+
+    def add_listener(self, listener):
+        """Registers listener(symbol, price), called whenever a symbol's price changes."""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def add_batch_listener(self, listener):
+        """Registers listener({symbol: price}), called once per batch of price changes,
+           for listeners whose work is per batch rather than per symbol."""
+        with self._lock:
+            self._batch_listeners.append(listener)
+
+    def invalidate(self, symbol=None):
+        """Drops one symbol, or the whole cache when symbol is None."""
+        with self._lock:
+            if symbol is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(symbol, None)
+            self.version += 1
+
+    def snapshot_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['size'] = len(self._entries)
+            stats['inflight'] = len(self._inflight)
+        return stats
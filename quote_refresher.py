@@ -0,0 +1,46 @@
+import threading
+
+
+class QuoteRefresher(threading.Thread):
+    """Background thread that keeps a QuoteCache warm.
+
+    Every `interval` seconds it asks `symbols()` for the set to cover, fetches
+    them in one batch and stores the results, so request handlers can read
+    quotes without touching the network."""
+
+    def __init__(self, cache, fetch_many, symbols, interval=15.0):
+        super().__init__(name='quote-refresher', daemon=True)
+        self.cache = cache
+        self._fetch_many = fetch_many
+        self._symbols = symbols
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self.refreshes = 0
+        self.failures = 0
+
+    def refresh_once(self):
+        """Fetches every covered symbol once. Failed symbols keep their last good quote."""
+        symbols = sorted(set(self._symbols()))
+        if not symbols:
+            return
+        try:
+            prices = self._fetch_many(symbols)
+        except Exception:
+            self.failures += 1
+            return
+        updates = {}
+        for symbol in symbols:
+            price = prices.get(symbol)
+            if price is not None or self.cache.peek(symbol) is None:
+                updates[symbol] = price
+        self.cache.put_many(updates)
+        self.refreshes += 1
+
+    def run(self):
+        while True:
+            self.refresh_once()
+            if self._stop_event.wait(self.interval):
+                break
+
+    def stop(self):
+        self._stop_event.set()
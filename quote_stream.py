@@ -0,0 +1,53 @@
+import threading
+
+
+class Subscription:
+    """One client's view of the feed. Updates are coalesced per symbol, so a
+    slow client only ever receives the latest price of each symbol."""
+
+    def __init__(self, wants):
+        self._wants = wants  # callable: symbol -> bool
+        self._pending = {}
+        self._cond = threading.Condition()
+
+    def offer(self, symbol, price):
+        if not self._wants(symbol):
+            return
+        with self._cond:
+            self._pending[symbol] = price
+            self._cond.notify()
+
+    def wait(self, timeout=None):
+        """Blocks until there are updates (or timeout) and returns {symbol: price}."""
+        with self._cond:
+            if not self._pending:
+                self._cond.wait(timeout)
+            pending, self._pending = self._pending, {}
+        return pending
+
+
+class QuoteFeed:
+    """Fans price changes from a single source out to every subscriber."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def subscribe(self, wants):
+        subscription = Subscription(wants)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, symbol, price):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.offer(symbol, price)
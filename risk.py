@@ -0,0 +1,257 @@
+import datetime
+import math
+import threading
+import time
+
+import numpy as np
+
+TRADING_DAYS = 252
+VAR_Z = 1.6448536269514722  # one-sided 95% normal quantile
+
+# Risk metrics usable as leaderboard ranking keys: {key: True if higher ranks first}
+RANKING_KEYS = {
+    'sharpe': True,
+    'volatility': False,
+    'beta': False,
+    'var': False,
+}
+
+RANKING_LABELS = {
+    'sharpe': 'Sharpe Ratio',
+    'volatility': 'Volatility',
+    'beta': 'Beta',
+    'var': 'Value at Risk',
+}
+
+
+class RollingCovariance:
+    """Means and co-moments of the last `window` return vectors (one column per
+    symbol), kept in a ring buffer.
+
+    push() applies Welford's running update for the new bar and its inverse
+    for the bar leaving the window, O(k^2) for k columns, instead of
+    recomputing over the whole window. The moments are recomputed exactly
+    once per window length to stop floating-point drift accumulating."""
+
+    def __init__(self, window):
+        if window < 2:
+            raise ValueError("window must be at least 2")
+        self.window = window
+        self.n = 0
+        self.mean = np.zeros(0)
+        self._rows = np.zeros((window, 0))
+        self._head = 0  # next row to overwrite, the oldest once the window is full
+        self._comoment = np.zeros((0, 0))
+        self._pushes = 0
+
+    def rows(self):
+        """The window's return vectors, oldest first."""
+        if self.n < self.window:
+            return self._rows[:self.n]
+        return np.concatenate([self._rows[self._head:], self._rows[:self._head]])
+
+    def reset(self, rows):
+        """Replaces the window with rows (oldest first, one column per symbol)."""
+        rows = np.asarray(rows, dtype=np.float64)[-self.window:]
+        self._rows = np.zeros((self.window, rows.shape[1]))
+        self._rows[:len(rows)] = rows
+        self.n = len(rows)
+        self._head = self.n % self.window
+        self.recompute()
+
+    def add_columns(self, columns):
+        """Appends columns (one value per bar in the window, oldest first)."""
+        self.reset(np.hstack([self.rows(), np.asarray(columns, dtype=np.float64).reshape(self.n, -1)]))
+
+    def recompute(self):
+        rows = self.rows()
+        self.mean = rows.mean(axis=0) if self.n else np.zeros(rows.shape[1])
+        deviations = rows - self.mean
+        self._comoment = deviations.T @ deviations
+
+    def push(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        if self.n == self.window:
+            # Inverse Welford step: take the oldest bar out of the moments
+            old = self._rows[self._head].copy()
+            mean = (self.n * self.mean - old) / (self.n - 1)
+            self._comoment -= np.outer(old - mean, old - self.mean)
+            self.mean = mean
+            self.n -= 1
+        self._rows[self._head] = x
+        self._head = (self._head + 1) % self.window
+        self.n += 1
+        delta = x - self.mean
+        self.mean = self.mean + delta / self.n
+        self._comoment += np.outer(delta, x - self.mean)
+
+        self._pushes += 1
+        if self._pushes % self.window == 0:
+            self.recompute()
+
+    def covariance(self):
+        if self.n < 2:
+            return np.full_like(self._comoment, np.nan)
+        return self._comoment / (self.n - 1)
+
+
+class RiskModel:
+    """Rolling daily-return statistics for every tracked symbol plus a benchmark.
+
+    History is downloaded once per symbol when it is first tracked; after that
+    each new daily bar comes from live quotes (on_price), and closing a bar
+    costs one incremental covariance update. analyze() turns a position
+    vector into volatility, beta, Sharpe ratio and value-at-risk."""
+
+    RETRY_SECONDS = 3600  # before re-requesting history that came back empty
+
+    def __init__(self, history, benchmark='SPY', window=60, risk_free_rate=0.0, clock=time.monotonic):
+        self._history = history  # (symbols, start, end) -> DataFrame of daily closes, dates x symbols
+        self.benchmark = benchmark
+        self.risk_free_rate = risk_free_rate
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._stats = RollingCovariance(window)
+        self._columns = {}  # {symbol: column}
+        self._last_close = np.zeros(0)
+        self._dates = []  # bar dates, oldest first; one more than the returns in the window
+        self._pending_date = None
+        self._pending = {}  # {symbol: latest price} of the bar still forming
+        self._unavailable = {}  # {symbol: retry after (clock)}
+        self.version = 0
+
+    @property
+    def last_date(self):
+        return self._dates[-1] if self._dates else None
+
+    def symbols(self):
+        with self._lock:
+            return list(self._columns)
+
+    def track(self, symbols, today, quotes=None):
+        """Starts tracking symbols, downloading their history once. Bars up to
+           the day before `today` come from history; later ones from quotes.
+           quotes ({symbol: price}) are today's prices so far, which start the
+           forming bar of a newly tracked symbol."""
+        import pandas as pd
+        now = self._clock()
+        with self._lock:
+            wanted = set(symbols)
+            if not self._columns:
+                wanted.add(self.benchmark)
+            new = sorted(symbol for symbol in wanted
+                         if symbol not in self._columns and self._unavailable.get(symbol, 0) <= now)
+        if not new:
+            return
+
+        end = today - datetime.timedelta(days=1)
+        start = end - datetime.timedelta(days=2 * self._stats.window + 10)
+        closes = self._history(new, start, end)
+        closes.index = pd.DatetimeIndex(closes.index).normalize()
+
+        with self._lock:
+            new = [symbol for symbol in new if symbol not in self._columns]
+            missing = [symbol for symbol in new
+                       if symbol not in closes.columns or closes[symbol].isna().all()]
+            for symbol in missing:
+                self._unavailable[symbol] = now + self.RETRY_SECONDS
+            new = [symbol for symbol in new if symbol not in missing]
+
+            if not self._columns:
+                # The benchmark's trading days define the window
+                if self.benchmark not in new:
+                    # Nothing can be tracked without it; retry everything together later
+                    for symbol in new:
+                        self._unavailable[symbol] = now + self.RETRY_SECONDS
+                    return
+                dates = closes[self.benchmark].dropna().index[-(self._stats.window + 1):]
+                self._dates = [date.date() for date in dates]
+            if not new:
+                return
+
+            frame = closes[new].reindex(pd.DatetimeIndex(self._dates)).ffill()
+            returns = frame.pct_change(fill_method=None).iloc[1:].fillna(0.0).to_numpy()
+            if self._columns:
+                self._stats.add_columns(returns)
+            else:
+                self._stats.reset(returns)
+            for symbol in new:
+                self._columns[symbol] = len(self._columns)
+            self._last_close = np.concatenate([self._last_close, frame.iloc[-1].to_numpy(dtype=np.float64)])
+            self.version += 1
+
+            self._roll(today)
+            for symbol in new:
+                price = (quotes or {}).get(symbol)
+                if price is not None and today > self.last_date:
+                    self._pending_date = today
+                    self._pending[symbol] = price
+
+    def on_price(self, symbol, price, today):
+        """Quote listener. The last price seen on a day becomes that day's
+           close when the first quote of a later day arrives."""
+        if price is None:
+            return
+        with self._lock:
+            if symbol not in self._columns:
+                return
+            self._roll(today)
+            if today > self.last_date:
+                self._pending_date = today
+                self._pending[symbol] = price
+
+    def roll(self, today):
+        """Closes the forming bar if `today` is past it."""
+        with self._lock:
+            self._roll(today)
+
+    def _roll(self, today):
+        if self._pending_date is None or today <= self._pending_date:
+            return
+        x = np.zeros(len(self._columns))
+        for symbol, price in self._pending.items():
+            column = self._columns[symbol]
+            last = self._last_close[column]
+            # A symbol without a quote that day, or without a prior close, contributes a 0% return
+            if last > 0:
+                x[column] = price / last - 1.0
+            self._last_close[column] = price
+        self._stats.push(x)
+        self._dates.append(self._pending_date)
+        del self._dates[:-(self._stats.window + 1)]
+        self._pending_date = None
+        self._pending = {}
+        self.version += 1
+
+    def analyze(self, values):
+        """Risk of a set of positions, {symbol: market value}. Returns
+           {'volatility' (annualized %), 'beta', 'sharpe' (annualized),
+           'var' (1-day 95% value-at-risk, $), 'days'} or None when nothing is
+           tracked. Untracked symbols are left out of the weights."""
+        with self._lock:
+            benchmark = self._columns.get(self.benchmark)
+            held = [(self._columns[symbol], value) for symbol, value in values.items()
+                    if symbol in self._columns and value > 0]
+            if benchmark is None or not held or self._stats.n < 2:
+                return None
+            columns = np.array([column for column, _ in held])
+            exposure = np.array([value for _, value in held], dtype=np.float64)
+            covariance = self._stats.covariance()
+            mean = self._stats.mean[columns]
+            days = self._stats.n
+            portfolio_cov = covariance[np.ix_(columns, columns)]
+            benchmark_cov = covariance[columns, benchmark]
+            benchmark_var = covariance[benchmark, benchmark]
+
+        total = exposure.sum()
+        weights = exposure / total
+        sigma = math.sqrt(max(float(weights @ portfolio_cov @ weights), 0.0))
+        mu = float(weights @ mean)
+        annual_sigma = sigma * math.sqrt(TRADING_DAYS)
+        return {
+            'volatility': annual_sigma * 100.0,
+            'beta': float(weights @ benchmark_cov / benchmark_var) if benchmark_var > 0 else None,
+            'sharpe': (mu * TRADING_DAYS - self.risk_free_rate) / annual_sigma if annual_sigma > 0 else None,
+            'var': max(VAR_Z * sigma - mu, 0.0) * float(total),
+            'days': days,
+        }
@@ -0,0 +1,208 @@
+import fcntl
+import os
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+MAGIC = 0x4D4F434B51544231  # "MOCKQTB1"
+SYMBOL_BYTES = 16
+HEADER = np.dtype([('magic', np.uint64), ('n_slots', np.int64), ('used', np.int64), ('reserved', np.int64)])
+SLOT = np.dtype([('seq', np.uint64), ('price', np.float64), ('ts', np.float64)])
+
+
+class SharedQuoteTable:
+    """Fixed-layout quote table in POSIX shared memory, shared by every worker.
+
+    Layout: a header (magic, slot count, slots in use), a symbol name per slot,
+    then (seq, price, timestamp) per slot. A single writer process updates a
+    slot seqlock-style: it bumps seq to odd, writes price and timestamp, then
+    bumps seq to even. Readers retry while seq is odd or changed underneath
+    them, so they never see a torn quote and never take a lock.
+
+    Any process may reserve a slot for a symbol it needs (name set, seq 0,
+    so no quote yet); the writer publishes every named slot. Allocating a
+    slot is the only locked operation, under a flock on the segment."""
+
+    def __init__(self, shm, owner=False):
+        self._shm = shm
+        self.owner = owner
+        self.header = np.ndarray((), dtype=HEADER, buffer=shm.buf, offset=0)
+        n_slots = int(self.header['n_slots'])
+        self.names = np.ndarray((n_slots,), dtype='S%d' % SYMBOL_BYTES, buffer=shm.buf, offset=HEADER.itemsize)
+        self.slots = np.ndarray((n_slots,), dtype=SLOT, buffer=shm.buf,
+                                offset=HEADER.itemsize + n_slots * SYMBOL_BYTES)
+        self._seq = self.slots['seq']
+        self._price = self.slots['price']
+        self._ts = self.slots['ts']
+        self._index = {}  # {symbol: slot}, mirrored from names
+        self._index_lock = threading.Lock()
+        self._alloc_lock = threading.Lock()  # flock does not exclude threads sharing the fd
+
+    @staticmethod
+    def _size(n_slots):
+        return HEADER.itemsize + n_slots * (SYMBOL_BYTES + SLOT.itemsize)
+
+    @classmethod
+    def open_or_create(cls, name, n_slots=4096):
+        """Attaches to the table, creating it if needed; used by the elected writer.
+           An existing table is reused so readers keep their mapping."""
+        table = cls.attach(name)
+        if table is not None:
+            table.owner = True
+            return table
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=cls._size(n_slots))
+        except FileExistsError:
+            # Lost a race with another creator, or a segment with a bad header
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=cls._size(n_slots))
+        # The segment outlives any one worker; don't let the resource tracker unlink it
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        header = np.ndarray((), dtype=HEADER, buffer=shm.buf, offset=0)
+        header['n_slots'] = n_slots
+        header['used'] = 0
+        header['magic'] = MAGIC
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        """Attaches to an existing table, or returns None if there is none yet."""
+        try:
+            shm = shared_memory.SharedMemory(name=name)
+        except FileNotFoundError:
+            return None
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        if shm.size < HEADER.itemsize or int(np.ndarray((), dtype=HEADER, buffer=shm.buf)['magic']) != MAGIC:
+            shm.close()
+            return None
+        return cls(shm)
+
+    def close(self):
+        self.header = self.names = self.slots = self._seq = self._price = self._ts = None
+        self._shm.close()
+
+    def _sync_index(self):
+        used = int(self.header['used'])
+        if used > len(self._index):
+            with self._index_lock:
+                for slot in range(len(self._index), used):
+                    self._index[self.names[slot].decode('ascii')] = slot
+
+    def slot_for(self, symbol):
+        self._sync_index()
+        return self._index.get(symbol)
+
+    def _allocate(self, symbol):
+        """Returns symbol's slot, naming the next free one if it has none, or
+           None if the table is full or the symbol does not fit."""
+        slot = self.slot_for(symbol)
+        if slot is not None:
+            return slot
+        try:
+            name = symbol.encode('ascii')
+        except UnicodeEncodeError:
+            return None
+        if len(name) > SYMBOL_BYTES:
+            return None
+        with self._alloc_lock:
+            fcntl.flock(self._shm._fd, fcntl.LOCK_EX)
+            try:
+                slot = self.slot_for(symbol)
+                if slot is None:
+                    used = int(self.header['used'])
+                    if used >= len(self.slots):
+                        return None
+                    slot = used
+                    self.names[slot] = name
+                    # Publish the name only after it is written
+                    self.header['used'] = used + 1
+            finally:
+                fcntl.flock(self._shm._fd, fcntl.LOCK_UN)
+        return slot
+
+    def reserve(self, symbols):
+        """Claims a slot for each symbol so the writer starts publishing it.
+           Returns the symbols that have a slot."""
+        return [symbol for symbol in symbols if self._allocate(symbol) is not None]
+
+    # --- writer side (single process) ---
+
+    def write(self, symbol, price, ts=None):
+        slot = self._allocate(symbol)
+        if slot is None:
+            return False
+        self._seq[slot] += 1
+        self._price[slot] = np.nan if price is None else price
+        self._ts[slot] = time.time() if ts is None else ts
+        self._seq[slot] += 1
+        return True
+
+    def write_many(self, prices, ts=None):
+        ts = time.time() if ts is None else ts
+        for symbol, price in prices.items():
+            self.write(symbol, price, ts)
+
+    # --- reader side (any process, lock-free) ---
+
+    def read(self, symbol, retries=100):
+        """Returns (price or None, timestamp) for symbol, or None if it has no slot."""
+        slot = self.slot_for(symbol)
+        if slot is None:
+            return None
+        for _ in range(retries):
+            before = int(self._seq[slot])
+            if before & 1:
+                continue
+            price = float(self._price[slot])
+            ts = float(self._ts[slot])
+            if int(self._seq[slot]) == before:
+                if before == 0:
+                    return None
+                return (None if np.isnan(price) else price), ts
+        return None
+
+    def read_many(self, symbols):
+        """Returns {symbol: (price or None, timestamp)} for the symbols that have a slot."""
+        quotes = {}
+        for symbol in symbols:
+            quote = self.read(symbol)
+            if quote is not None:
+                quotes[symbol] = quote
+        return quotes
+
+    def symbols(self):
+        self._sync_index()
+        return list(self._index)
+
+
+class WriterElection:
+    """Elects one writer process through an exclusive, non-blocking flock.
+
+    The lock is held for the life of the winning process; when it exits the
+    kernel releases it and the next worker to call try_acquire() takes over."""
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+        self._pid = None
+
+    @property
+    def is_writer(self):
+        return self._fd is not None and self._pid == os.getpid()
+
+    def try_acquire(self):
+        if self.is_writer:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        self._pid = os.getpid()
+        return True
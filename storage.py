@@ -0,0 +1,256 @@
+import os
+import sqlite3
+import threading
+import time
+
+# Every state change is one of these ledger entries:
+#   open  - account created with `amount` starting cash (carries `password_hash`)
+#   buy   - `shares` of `symbol` bought at `price`
+#   sell  - `shares` of `symbol` sold at `price`
+#   fee   - `amount` paid to enter `contest_id`
+#   order  - resting `order_type` order for `shares` of `symbol`, trigger `price`;
+#            the entry's id is the order id
+#   cancel - resting order `order_id` cancelled
+#   reject - resting order `order_id` triggered but could not fill, because of `reason`
+# A buy or sell that fills a resting order carries its `order_id`.
+LEDGER_FIELDS = ('username', 'kind', 'symbol', 'contest_id', 'shares', 'price', 'amount',
+                 'order_id', 'order_type', 'reason')
+
+
+class LedgerError(Exception):
+    """Raised by a transaction builder to reject a request (e.g. insufficient balance)."""
+
+
+def ledger_entry(username, kind, symbol=None, contest_id=None, shares=0, price=0.0, amount=0.0,
+                 order_id=None, order_type=None, reason=None, ts=None, **extra):
+    """ts is the entry's epoch time on the market clock (wall time if omitted)."""
+    entry = {'username': username, 'kind': kind, 'symbol': symbol, 'contest_id': contest_id,
+             'shares': shares, 'price': price, 'amount': amount, 'order_id': order_id,
+             'order_type': order_type, 'reason': reason, 'ts': time.time() if ts is None else ts}
+    entry.update(extra)
+    return entry
+
+
+class MemoryStorage:
+    """Keeps state only in the process's dicts, as the app always has.
+
+    `apply(entry)` materializes one ledger entry into the in-memory state.
+    Callers serialize writes per user (see TradeEngine), so only appending
+    to the ledger itself is locked here."""
+
+    def __init__(self, apply):
+        self._apply = apply
+        self._lock = threading.Lock()
+        self.ledger = []
+
+    def sync(self):
+        """Nothing to catch up on: this process is the only writer."""
+
+    def close(self):
+        """Nothing to release."""
+
+    def entries(self, usernames=None):
+        """Returns ledger entries in order, optionally only for usernames."""
+        with self._lock:
+            ledger = list(self.ledger)
+        if usernames is None:
+            return ledger
+        usernames = set(usernames)
+        return [entry for entry in ledger if entry['username'] in usernames]
+
+    def execute(self, build):
+        """Runs build() -> [entries] and applies the entries.
+           build may raise LedgerError to abort without side effects."""
+        entries = build()
+        with self._lock:
+            for entry in entries:
+                entry['id'] = len(self.ledger) + 1
+                self.ledger.append(entry)
+        for entry in entries:
+            self._apply(entry)
+        return entries
+
+
+class _PendingWrite:
+    """One execute() call waiting to be committed in a group."""
+
+    def __init__(self, build):
+        self.build = build
+        self.entries = None
+        self.error = None
+        self.done = False
+
+
+class SQLiteStorage:
+    """Append-only ledger in a SQLite database (WAL mode) shared by every worker.
+
+    Each worker reuses one connection and tails the ledger by row id, applying
+    new entries to its in-memory state, so all workers converge on the same
+    balances and holdings. Writes take SQLite's write lock (BEGIN IMMEDIATE),
+    catch up, validate and append in one transaction.
+
+    Writes are group-committed: while one thread commits, concurrent
+    execute() calls queue up, and the next leader runs all of them in a
+    single transaction (one savepoint each, so a rejected build rolls back
+    alone) and a single COMMIT. Builds in one group must not depend on each
+    other's entries; TradeEngine's per-user locks keep each user's writes
+    in separate groups."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (
+            username TEXT PRIMARY KEY,
+            password_hash TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS ledger (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts REAL NOT NULL,
+            username TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            symbol TEXT,
+            contest_id TEXT,
+            shares INTEGER NOT NULL DEFAULT 0,
+            price REAL NOT NULL DEFAULT 0,
+            amount REAL NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS ledger_username ON ledger (username);
+    """
+
+    ORDER_COLUMNS = (('order_id', 'INTEGER'), ('order_type', 'TEXT'), ('reason', 'TEXT'))
+
+    INSERT_USER = "INSERT INTO users (username, password_hash) VALUES (?, ?)"
+    INSERT_ENTRY = ("INSERT INTO ledger (ts, username, kind, symbol, contest_id, shares, price, amount, "
+                    "order_id, order_type, reason) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+    SELECT_SINCE = ("SELECT l.id, l.ts, l.username, l.kind, l.symbol, l.contest_id, l.shares, l.price, "
+                    "l.amount, l.order_id, l.order_type, l.reason, u.password_hash "
+                    "FROM ledger l LEFT JOIN users u ON u.username = l.username "
+                    "WHERE l.id > ? ORDER BY l.id")
+
+    def __init__(self, path, apply, timeout=30.0):
+        self.path = path
+        self._apply = apply
+        self._timeout = timeout
+        self._lock = threading.RLock()
+        self._conn = None
+        self._pid = None
+        self._last_id = 0
+        self._group = threading.Condition()
+        self._pending = []  # [_PendingWrite] queued for the next group commit
+        self._committing = False
+        self.commits = 0
+        self.grouped_writes = 0
+        with self._lock:
+            conn = self._connection()
+            conn.executescript(self.SCHEMA)
+            # Ledgers written before resting orders were stored lack their columns
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(ledger)")}
+            for column, kind in self.ORDER_COLUMNS:
+                if column not in columns:
+                    conn.execute("ALTER TABLE ledger ADD COLUMN %s %s" % (column, kind))
+
+    def _connection(self):
+        # One connection per worker process; reopen after a fork
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self._timeout, isolation_level=None,
+                                   check_same_thread=False, cached_statements=256)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def close(self):
+        """Closes this process's connection; the next call reopens it. A
+           preloading master calls this before forking, so no worker inherits
+           (and later closes) a connection it did not open."""
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+            self._pid = None
+
+    def _catch_up(self, conn):
+        for row in conn.execute(self.SELECT_SINCE, (self._last_id,)):
+            entry = dict(zip(('id', 'ts') + LEDGER_FIELDS + ('password_hash',), row))
+            self._apply(entry)
+            self._last_id = entry['id']
+
+    def sync(self):
+        """Applies ledger entries written by other workers since the last sync."""
+        with self._lock:
+            self._catch_up(self._connection())
+
+    def entries(self, usernames=None):
+        """Returns ledger entries in order, optionally only for usernames."""
+        fields = ('id', 'ts') + LEDGER_FIELDS
+        sql = "SELECT %s FROM ledger" % ', '.join(fields)
+        params = ()
+        if usernames is not None:
+            usernames = list(usernames)
+            if not usernames:
+                return []
+            sql += " WHERE username IN (%s)" % ', '.join('?' * len(usernames))
+            params = tuple(usernames)
+        with self._lock:
+            rows = self._connection().execute(sql + " ORDER BY id", params).fetchall()
+        return [dict(zip(fields, row)) for row in rows]
+
+    def execute(self, build):
+        """Runs build() -> [entries] inside a write transaction and commits its
+           entries together. build may raise LedgerError to roll back."""
+        write = _PendingWrite(build)
+        with self._group:
+            self._pending.append(write)
+            while self._committing and not write.done:
+                self._group.wait()
+            if not write.done:
+                # Lead the next group: everything queued so far, ours included
+                self._committing = True
+                group, self._pending = self._pending, []
+        if not write.done:
+            try:
+                self._commit_group(group)
+            finally:
+                with self._group:
+                    for pending in group:
+                        pending.done = True
+                    self._committing = False
+                    self._group.notify_all()
+        if write.error is not None:
+            raise write.error
+        return write.entries
+
+    def _commit_group(self, group):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._catch_up(conn)
+                for write in group:
+                    conn.execute("SAVEPOINT write")
+                    try:
+                        entries = write.build()
+                        for entry in entries:
+                            if entry['kind'] == 'open':
+                                conn.execute(self.INSERT_USER, (entry['username'], entry['password_hash']))
+                            cursor = conn.execute(self.INSERT_ENTRY,
+                                                  (entry['ts'],) + tuple(entry[f] for f in LEDGER_FIELDS))
+                            entry['id'] = cursor.lastrowid
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO write")
+                        write.error = e
+                    else:
+                        write.entries = entries
+                    conn.execute("RELEASE write")
+                conn.execute("COMMIT")
+            except BaseException as e:
+                conn.execute("ROLLBACK")
+                for write in group:
+                    write.entries = None
+                    write.error = write.error or e
+                raise
+            self.commits += 1
+            self.grouped_writes += len(group)
+            for write in group:
+                for entry in write.entries or ():
+                    self._apply(entry)
+                    self._last_id = entry['id']
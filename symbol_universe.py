@@ -0,0 +1,147 @@
+import bisect
+import csv
+import io
+import os
+import threading
+import time
+
+
+class SymbolUniverse:
+    """Known tradable symbols, loaded from a CSV file (symbol,name,exchange;
+    the header row is optional) into parallel sorted lists.
+
+    Membership and prefix lookups are binary searches, so an unknown or
+    mistyped ticker is rejected in microseconds, before any price lookup.
+    The file is re-checked at most every `check_interval` seconds: rows
+    appended since the last read are merged in without re-reading the rest
+    of the file, any other change triggers a full reload. Each load swaps in
+    a new snapshot, so readers never take a lock."""
+
+    TAIL_BYTES = 64  # bytes before the read offset compared to detect rewrites
+
+    def __init__(self, path, check_interval=5.0, clock=time.monotonic):
+        self.path = path
+        self.check_interval = check_interval
+        self._clock = clock
+        self._lock = threading.Lock()  # serializes reloads
+        self._snapshot = ([], [])  # (sorted symbols, [(name, exchange)] in the same order)
+        self._file_state = None  # (inode, size, mtime) when last read
+        self._offset = 0  # end of the last complete line read
+        self._tail = b''
+        self._next_check = 0.0
+        self.loaded = False
+        self.reload()
+
+    def __len__(self):
+        return len(self._snapshot[0])
+
+    def __contains__(self, symbol):
+        self._maybe_reload()
+        return self._contains(symbol)
+
+    def _contains(self, symbol):
+        symbols = self._snapshot[0]
+        i = bisect.bisect_left(symbols, symbol)
+        return i < len(symbols) and symbols[i] == symbol
+
+    def is_valid(self, symbol):
+        """False only for symbols a loaded universe does not list; without a
+           universe file every symbol is let through to the price provider."""
+        # Reload first: a universe file that appeared since is only `loaded` after it
+        self._maybe_reload()
+        return not self.loaded or self._contains(symbol)
+
+    def search(self, prefix, limit=10):
+        """Up to `limit` [{'symbol', 'name', 'exchange'}] whose symbol starts with prefix."""
+        self._maybe_reload()
+        symbols, info = self._snapshot
+        start = bisect.bisect_left(symbols, prefix)
+        matches = []
+        for i in range(start, min(start + limit, len(symbols))):
+            if not symbols[i].startswith(prefix):
+                break
+            matches.append({'symbol': symbols[i], 'name': info[i][0], 'exchange': info[i][1]})
+        return matches
+
+    def _maybe_reload(self):
+        now = self._clock()
+        if now >= self._next_check:
+            self._next_check = now + self.check_interval
+            self.reload()
+
+    def reload(self):
+        """Picks up changes to the file. Returns True if anything was read."""
+        with self._lock:
+            try:
+                st = os.stat(self.path)
+            except OSError:
+                return False  # keep serving what is loaded
+            state = (st.st_ino, st.st_size, st.st_mtime_ns)
+            if state == self._file_state:
+                return False
+
+            with open(self.path, 'rb') as f:
+                if self._is_append(f, st):
+                    f.seek(self._offset)
+                    data = f.read()
+                    # Merge complete lines only; a partly written row is read next time
+                    end = data.rfind(b'\n') + 1
+                    self._merge(self._parse(data[:end]))
+                else:
+                    data = f.read()
+                    end = data.rfind(b'\n') + 1 if data.endswith(b'\n') else len(data)
+                    self._snapshot = self._build(self._parse(data))
+                    self._offset = 0
+                    self._tail = b''
+            self._offset += end
+            self._tail = (self._tail + data[:end])[-self.TAIL_BYTES:]
+            self._file_state = state
+            self.loaded = True
+            return True
+
+    def _is_append(self, f, st):
+        if self._file_state is None or st.st_ino != self._file_state[0] or st.st_size <= self._offset:
+            return False
+        if not self._tail.endswith(b'\n'):
+            return False
+        f.seek(self._offset - len(self._tail))
+        return f.read(len(self._tail)) == self._tail
+
+    @staticmethod
+    def _parse(data):
+        rows = {}
+        for row in csv.reader(io.StringIO(data.decode('utf-8', errors='replace'))):
+            if not row or not row[0].strip() or row[0].strip().lower() == 'symbol':
+                continue
+            symbol = row[0].strip().upper()
+            name = row[1].strip() if len(row) > 1 else ''
+            exchange = row[2].strip() if len(row) > 2 else ''
+            rows[symbol] = (name, exchange)
+        return rows
+
+    @staticmethod
+    def _build(rows):
+        symbols = sorted(rows)
+        return symbols, [rows[symbol] for symbol in symbols]
+
+    def _merge(self, rows):
+        """Merges new rows into the current snapshot in one linear pass; a
+           repeated symbol takes the new name and exchange."""
+        if not rows:
+            return
+        old_symbols, old_info = self._snapshot
+        new_symbols = sorted(rows)
+        symbols, info = [], []
+        i = j = 0
+        while i < len(old_symbols) or j < len(new_symbols):
+            if j == len(new_symbols) or (i < len(old_symbols) and old_symbols[i] < new_symbols[j]):
+                symbols.append(old_symbols[i])
+                info.append(old_info[i])
+                i += 1
+            else:
+                if i < len(old_symbols) and old_symbols[i] == new_symbols[j]:
+                    i += 1
+                symbols.append(new_symbols[j])
+                info.append(rows[new_symbols[j]])
+                j += 1
+        self._snapshot = (symbols, info)
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from backtest import replay
+
+DATES = pd.bdate_range('2023-01-02', periods=4)
+
+
+def _entry(day, username, kind, symbol=None, shares=0, price=0.0, amount=0.0):
+    # Mid-morning of DATES[day]; negative days fall before the window
+    ts = DATES[0].timestamp() + day * 86400 + 3600
+    return {'ts': ts, 'username': username, 'kind': kind, 'symbol': symbol,
+            'shares': shares, 'price': price, 'amount': amount}
+
+
+def test_replay_values_holdings_and_cash():
+    prices = pd.DataFrame({'A': [10.0, 11.0, np.nan, 13.0]}, index=DATES)
+    entries = [_entry(-5, 'u', 'open', amount=1000.0),
+               _entry(1, 'u', 'buy', 'A', shares=10, price=11.0),
+               _entry(3, 'u', 'sell', 'A', shares=4, price=13.0)]
+    result = replay(entries, prices, ['u', 'idle'], initial_capital=500.0)
+    assert result.equity['u'].tolist() == [1000.0, 1000.0, 1000.0, 1020.0]
+    # No open entry in the ledger: scored as untouched starting capital
+    assert result.equity['idle'].tolist() == [500.0] * 4
+    assert [row['username'] for row in result.standings()] == ['u', 'idle']
+
+
+def test_replay_values_symbols_without_closes_at_their_last_traded_price():
+    prices = pd.DataFrame({'A': [10.0, 11.0, 12.0, 13.0], 'DEAD': [np.nan] * 4}, index=DATES)
+    entries = [_entry(-5, 'u', 'open', amount=1000.0),
+               _entry(-5, 'v', 'open', amount=1000.0),
+               # All-NaN column
+               _entry(1, 'u', 'buy', 'DEAD', shares=10, price=20.0),
+               # Not in the price matrix at all; v's later trade reprices u's position
+               _entry(2, 'u', 'buy', 'GONE', shares=5, price=8.0),
+               _entry(3, 'v', 'buy', 'GONE', shares=1, price=9.0),
+               _entry(1, 'v', 'buy', 'A', shares=10, price=11.0)]
+    result = replay(entries, prices, ['u', 'v'])
+    assert not result.equity.isna().any().any()
+    assert result.equity['u'].tolist() == [1000.0, 1000.0, 1000.0, 1005.0]
+    assert result.equity['v'].tolist() == [1000.0, 1000.0, 1010.0, 1020.0]
+    assert result.rank.to_dict() == {'u': 2, 'v': 1}
+
+
+def test_replay_scores_accounts_opened_after_the_window_as_starting_capital():
+    prices = pd.DataFrame({'A': [10.0, 11.0, 12.0, 13.0]}, index=DATES)
+    entries = [_entry(10, 'late', 'open', amount=1000.0)]
+    result = replay(entries, prices, ['late'], initial_capital=1000.0)
+    assert result.standings() == [{'rank': 1, 'username': 'late', 'net_worth': 1000.0,
+                                   'returns': 0.0, 'max_drawdown': 0.0}]
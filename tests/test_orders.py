@@ -0,0 +1,147 @@
+import pytest
+
+from orders import OrderEngine, OrderError, _TriggerBook
+from storage import LedgerError, MemoryStorage, ledger_entry
+
+
+def _book(*orders):
+    book = _TriggerBook()
+    for seq, (order_id, order_type, trigger) in enumerate(orders):
+        book.push({'id': order_id, 'type': order_type, 'trigger': trigger}, seq)
+    return book
+
+
+def test_trigger_book_fires_only_crossed_orders_in_trigger_order():
+    book = _book((1, 'limit_buy', 10.0), (2, 'limit_buy', 12.0), (3, 'stop_loss', 11.0),
+                 (4, 'take_profit', 20.0), (5, 'limit_sell', 18.0), (6, 'limit_buy', 12.0))
+    is_open = lambda order_id: True
+    assert book.pop_triggered(15.0, is_open) == []
+    # 'down' orders: highest trigger first, ties in placement order
+    assert book.pop_triggered(11.5, is_open) == [2, 6]
+    assert book.pop_triggered(9.0, is_open) == [3, 1]
+    # 'up' orders: lowest trigger first
+    assert book.pop_triggered(25.0, is_open) == [5, 4]
+    assert book.down == [] and book.up == []
+
+
+def test_trigger_book_drops_cancelled_orders_lazily():
+    book = _book((1, 'limit_buy', 12.0), (2, 'limit_buy', 10.0), (3, 'take_profit', 20.0))
+    cancelled = {1, 3}
+    is_open = lambda order_id: order_id not in cancelled
+    # Nothing is crossed, but the cancelled orders at the top of each heap are discarded
+    assert book.pop_triggered(15.0, is_open) == []
+    assert [entry[2] for entry in book.down] == [2]
+    assert book.up == []
+    assert book.pop_triggered(10.0, is_open) == [2]
+
+
+def _engine(fill=None, storage=None):
+    """An engine over a MemoryStorage ledger. fill(order, price) defaults to
+       writing the trade; the engine's check runs first, as in a transaction."""
+    engine = OrderEngine(lambda username, build: storage.execute(build),
+                         lambda order, price, check: storage.execute(
+                             lambda: (check(), (fill or _trade)(order, price))[1]))
+    if storage is None:
+        storage = MemoryStorage(lambda entry: engine.apply(entry))
+    engine.storage = storage
+    return engine
+
+
+def _trade(order, price):
+    return [ledger_entry(order['username'], order['action'], symbol=order['symbol'], shares=order['shares'],
+                         price=price, order_id=order['id'])]
+
+
+def _follower(engine):
+    """A second worker's engine, materialized from engine's ledger."""
+    follower = OrderEngine(None, None)
+    for entry in engine.storage.entries():
+        follower.apply(entry)
+    return follower
+
+
+def test_engine_fills_crossed_orders_and_skips_cancelled():
+    engine = _engine()
+    first = engine.place('alice', 'AAPL', 'limit_buy', 5, 100.0)
+    second = engine.place('alice', 'AAPL', 'limit_buy', 5, 99.0)
+    engine.cancel('alice', first['id'])
+    with pytest.raises(OrderError):
+        engine.cancel('alice', first['id'])
+    with pytest.raises(OrderError):
+        engine.cancel('bob', second['id'])
+
+    assert engine.on_price('AAPL', 101.0) == []
+    engine.on_price('AAPL', 98.0)
+    assert [(entry['kind'], entry['order_id']) for entry in engine.storage.entries()] == [
+        ('order', None), ('order', None), ('cancel', first['id']), ('buy', second['id'])]
+    assert [(order['status'], order['fill_price']) for order in engine.orders_for('alice')] == [
+        ('cancelled', None), ('filled', 98.0)]
+    # Nothing open is left on AAPL, so its book is gone
+    assert engine.symbols() == []
+
+
+def test_orders_are_shared_through_the_ledger():
+    engine = _engine()
+    kept = engine.place('alice', 'AAPL', 'stop_loss', 5, 90.0)
+    cancelled = engine.place('alice', 'MSFT', 'limit_sell', 5, 400.0)
+    engine.cancel('alice', cancelled['id'])
+
+    follower = _follower(engine)
+    assert [(order['id'], order['status']) for order in follower.orders_for('alice')] == [
+        (kept['id'], 'open'), (cancelled['id'], 'cancelled')]
+    assert follower.symbols() == ['AAPL']
+
+
+def test_order_filled_by_another_worker_is_not_filled_again():
+    engine = _engine()
+    order = engine.place('alice', 'AAPL', 'limit_buy', 5, 100.0)
+    execute = engine.storage.execute
+
+    def racing_execute(build):
+        # Another worker's fill commits first; this transaction catches up with it
+        engine.storage.execute = execute
+        execute(lambda: _trade(order, 95.0))
+        return execute(build)
+
+    engine.storage.execute = racing_execute
+    engine.on_price('AAPL', 96.0)
+    assert [entry['kind'] for entry in engine.storage.entries()] == ['order', 'buy']
+    assert [(order['status'], order['fill_price']) for order in engine.orders_for('alice')] == [('filled', 95.0)]
+    assert engine.symbols() == []
+
+
+def test_engine_records_rejected_fills():
+    def fill(order, price):
+        raise LedgerError("Insufficient balance.")
+
+    engine = _engine(fill)
+    engine.place('alice', 'AAPL', 'limit_buy', 5, 100.0)
+    engine.on_price('AAPL', 90.0)
+    order, = engine.orders_for('alice')
+    assert (order['status'], order['reason']) == ('rejected', "Insufficient balance.")
+    assert _follower(engine).orders_for('alice')[0]['status'] == 'rejected'
+
+
+def test_engine_requeues_orders_whose_fill_failed():
+    failures = [RuntimeError("database is locked")]
+
+    def fill(order, price):
+        if failures:
+            raise failures.pop()
+        return _trade(order, price)
+
+    engine = _engine(fill)
+    engine.place('alice', 'AAPL', 'limit_buy', 5, 100.0)
+    engine.on_price('AAPL', 90.0)
+    assert engine.orders_for('alice')[0]['status'] == 'open'
+    assert engine.symbols() == ['AAPL']
+    engine.on_price('AAPL', 91.0)
+    assert engine.orders_for('alice')[0]['status'] == 'filled'
+
+
+@pytest.mark.parametrize('shares, trigger', [(0, 10.0), (1, 0.0), (1, float('nan')), (1, float('inf'))])
+def test_engine_rejects_invalid_orders(shares, trigger):
+    engine = _engine()
+    with pytest.raises(OrderError):
+        engine.place('alice', 'AAPL', 'limit_buy', shares, trigger)
+    assert engine.storage.entries() == []
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from risk import RollingCovariance
+
+
+def test_rolling_covariance_matches_numpy_over_the_window():
+    rng = np.random.default_rng(0)
+    rows = rng.normal(0.001, 0.02, size=(50, 3))
+    stats = RollingCovariance(window=7)
+    stats.reset(rows[:3])
+    for i, row in enumerate(rows[3:], start=3):
+        stats.push(row)
+        window = rows[max(0, i - 6):i + 1]
+        np.testing.assert_allclose(stats.rows(), window)
+        np.testing.assert_allclose(stats.mean, window.mean(axis=0), atol=1e-12)
+        np.testing.assert_allclose(stats.covariance(), np.cov(window, rowvar=False), atol=1e-12)
+
+
+def test_rolling_covariance_reset_and_add_columns():
+    rng = np.random.default_rng(1)
+    rows = rng.normal(size=(10, 2))
+    extra = rng.normal(size=(5, 1))
+    stats = RollingCovariance(window=5)
+    stats.reset(rows)
+    stats.add_columns(extra)
+    window = np.hstack([rows[-5:], extra])
+    np.testing.assert_allclose(stats.covariance(), np.cov(window, rowvar=False), atol=1e-12)
+
+    row = rng.normal(size=3)
+    stats.push(row)
+    window = np.vstack([window[1:], row])
+    np.testing.assert_allclose(stats.covariance(), np.cov(window, rowvar=False), atol=1e-12)
+
+
+def test_rolling_covariance_is_undefined_below_two_rows():
+    stats = RollingCovariance(window=5)
+    stats.reset(np.ones((1, 2)))
+    assert np.isnan(stats.covariance()).all()
+    with pytest.raises(ValueError):
+        RollingCovariance(window=1)
@@ -0,0 +1,83 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from storage import LedgerError, SQLiteStorage, ledger_entry
+
+
+@pytest.fixture
+def storage(tmp_path):
+    applied = []
+    storage = SQLiteStorage(str(tmp_path / 'ledger.db'), applied.append)
+    storage.applied = applied
+    return storage
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def _run(storage, build, results, key):
+    try:
+        results[key] = storage.execute(build)
+    except Exception as e:
+        results[key] = e
+
+
+def test_execute_applies_and_persists(storage, tmp_path):
+    storage.execute(lambda: [ledger_entry('alice', 'open', amount=1000.0, password_hash='x')])
+    storage.execute(lambda: [ledger_entry('alice', 'buy', symbol='AAPL', shares=2, price=10.0)])
+    assert [entry['kind'] for entry in storage.applied] == ['open', 'buy']
+
+    # A second worker catches up from the file
+    replayed = []
+    SQLiteStorage(str(tmp_path / 'ledger.db'), replayed.append).sync()
+    assert [(entry['kind'], entry['password_hash']) for entry in replayed] == [('open', 'x'), ('buy', 'x')]
+
+
+def test_rejected_build_in_a_group_rolls_back_alone(storage):
+    storage.execute(lambda: [ledger_entry('taken', 'open', amount=1.0, password_hash='x')])
+    release = threading.Event()
+
+    def slow_build():
+        release.wait(5)
+        return [ledger_entry('leader', 'open', amount=1.0, password_hash='x')]
+
+    def rejected():
+        raise LedgerError("Insufficient balance.")
+
+    builds = {
+        'leader': slow_build,
+        'bob': lambda: [ledger_entry('bob', 'open', amount=1.0, password_hash='x')],
+        'rejected': rejected,
+        # Its first row is written before the duplicate user fails; the savepoint must undo it
+        'partial': lambda: [ledger_entry('carol', 'buy', symbol='AAPL', shares=1, price=1.0),
+                            ledger_entry('taken', 'open', amount=1.0, password_hash='y')],
+        'dave': lambda: [ledger_entry('dave', 'open', amount=1.0, password_hash='x')],
+    }
+    results = {}
+    threads = {key: threading.Thread(target=_run, args=(storage, build, results, key))
+               for key, build in builds.items()}
+    threads['leader'].start()
+    _wait_for(lambda: storage._committing)
+    for key in ('bob', 'rejected', 'partial', 'dave'):
+        threads[key].start()
+    # Everyone else queues behind the leader and commits in the next group
+    _wait_for(lambda: len(storage._pending) == 4)
+    release.set()
+    for thread in threads.values():
+        thread.join(5)
+
+    assert storage.commits == 3
+    assert storage.grouped_writes == 6
+    assert isinstance(results['rejected'], LedgerError)
+    assert isinstance(results['partial'], sqlite3.IntegrityError)
+    for key in ('leader', 'bob', 'dave'):
+        assert [entry['username'] for entry in results[key]] == [key]
+    assert [entry['username'] for entry in storage.entries()] == ['taken', 'leader', 'bob', 'dave']
+    assert [entry['username'] for entry in storage.applied] == ['taken', 'leader', 'bob', 'dave']
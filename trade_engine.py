@@ -0,0 +1,110 @@
+import threading
+import time
+import zlib
+
+from storage import LedgerError, ledger_entry
+
+
+class TradeEngine:
+    """Executes buys, sells and contest fees atomically, serialized per user.
+
+    Users are hashed onto a fixed set of lock stripes, so requests for
+    different users run in parallel while two requests for the same user
+    can never both pass a balance check. Each call validates and writes all
+    of its ledger entries in one storage transaction: either every order in
+    a batch fills or none do."""
+
+    def __init__(self, storage, get_state, get_price, stripes=64, clock=time.time):
+        self.storage = storage
+        self._get_state = get_state  # username -> (user_data, user_portfolio)
+        self._get_price = get_price  # symbol -> price or None
+        self._clock = clock  # stamps ledger entries; the price provider's clock in replay mode
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self.stats = {'orders': 0, 'rejected': 0}
+
+    def lock_for(self, username):
+        return self._locks[zlib.crc32(username.encode('utf-8')) % len(self._locks)]
+
+    def execute(self, username, build):
+        """Runs storage.execute(build) while holding username's lock."""
+        with self.lock_for(username):
+            return self.storage.execute(build)
+
+    def submit(self, username, orders, prices=None, check=None, order_id=None):
+        """Fills a batch of orders [{'action': 'buy'|'sell', 'symbol': ..., 'shares': ...}]
+           for one user. Raises LedgerError and fills nothing if any order fails.
+           prices ({symbol: price}) fixes the fill price, e.g. for triggered orders.
+           check() runs first inside the transaction and may raise to abort;
+           order_id links the entries to the resting order they fill."""
+        orders = [self._normalize(order) for order in orders]
+
+        # Price every symbol before taking the lock; quotes may hit the network
+        prices = dict(prices or {})
+        for order in orders:
+            symbol = order['symbol']
+            if symbol not in prices:
+                prices[symbol] = self._get_price(symbol)
+                if prices[symbol] is None:
+                    self.stats['rejected'] += 1
+                    raise LedgerError("Invalid stock symbol or price not available.")
+
+        def build():
+            if check is not None:
+                check()
+            user_data, user_portfolio = self._get_state(username)
+            balance = user_data['balance']
+            held = {symbol: data['shares'] for symbol, data in user_portfolio.items()}
+            entries = []
+            # Validate against the running result of the earlier orders in the batch
+            for order in orders:
+                symbol, shares = order['symbol'], order['shares']
+                price = prices[symbol]
+                if order['action'] == 'buy':
+                    if balance < shares * price:
+                        raise LedgerError("Insufficient balance.")
+                    balance -= shares * price
+                    held[symbol] = held.get(symbol, 0) + shares
+                else:
+                    if held.get(symbol, 0) < shares:
+                        raise LedgerError("Insufficient shares to sell.")
+                    balance += shares * price
+                    held[symbol] -= shares
+                entries.append(ledger_entry(username, order['action'], symbol=symbol, shares=shares,
+                                            price=price, order_id=order_id, ts=self._clock()))
+            return entries
+
+        try:
+            entries = self.execute(username, build)
+        except LedgerError:
+            self.stats['rejected'] += 1
+            raise
+        self.stats['orders'] += len(entries)
+        return entries
+
+    def pay_fee(self, username, contest_id, contest_data):
+        """Charges contest_data's entry fee and enrolls username, once."""
+        def build():
+            user_data, _ = self._get_state(username)
+            if username in contest_data['participants']:
+                raise LedgerError("You have already joined this contest.")
+            if user_data['balance'] < contest_data['entry_fee']:
+                raise LedgerError("Insufficient balance to join the contest.")
+            return [ledger_entry(username, 'fee', contest_id=contest_id, amount=contest_data['entry_fee'],
+                                 ts=self._clock())]
+        return self.execute(username, build)
+
+    @staticmethod
+    def _normalize(order):
+        action = order.get('action')
+        if action not in ('buy', 'sell'):
+            raise LedgerError("Invalid action.")
+        symbol = str(order.get('symbol', '')).strip().upper()
+        if not symbol:
+            raise LedgerError("Invalid stock symbol or price not available.")
+        try:
+            shares = int(order.get('shares'))
+        except (TypeError, ValueError):
+            raise LedgerError("Invalid number of shares.")
+        if shares <= 0:
+            raise LedgerError("Invalid number of shares.")
+        return {'action': action, 'symbol': symbol, 'shares': shares}
@@ -0,0 +1,168 @@
+import threading
+
+import numpy as np
+
+
+class Valuation:
+    """Result of one vectorized valuation pass over every holding."""
+
+    def __init__(self, user_index, value, cost):
+        self._user_index = user_index  # {username: row}
+        self.value = value  # market value per user
+        self.cost = cost  # cost basis per user
+        self.pnl = value - cost
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.returns = np.where(cost > 0, self.pnl / cost * 100.0, 0.0)
+
+    def _get(self, array, username):
+        row = self._user_index.get(username)
+        if row is None or row >= len(array):
+            return 0.0
+        return float(array[row])
+
+    def value_of(self, username):
+        return self._get(self.value, username)
+
+    def pnl_of(self, username):
+        return self._get(self.pnl, username)
+
+    def returns_of(self, username):
+        return self._get(self.returns, username)
+
+    def as_dict(self):
+        """Returns {username: portfolio value} for every known user."""
+        return {username: float(self.value[row]) for username, row in self._user_index.items()
+                if row < len(self.value)}
+
+
+class HoldingsStore:
+    """Columnar holdings: parallel arrays of user index, symbol index, shares and
+    cost basis (per-share purchase price), one row per (user, symbol) position.
+
+    Given a price per symbol column, valuate() scores every user in a single
+    vectorized pass. Positions whose symbol has no price fall back to their
+    purchase price, as calculate_portfolio_value always has."""
+
+    def __init__(self, capacity=1024):
+        self._lock = threading.Lock()
+        self._users = {}  # {username: user index}
+        self._symbols = {}  # {symbol: column}
+        self._symbol_names = []  # [symbol] in column order
+        self._rows = {}  # {(user index, column): row}
+        self._user_rows = {}  # {user index: set(row)}
+        self._size = 0
+        self._user_idx = np.zeros(capacity, dtype=np.int64)
+        self._sym_idx = np.zeros(capacity, dtype=np.int64)
+        self._shares = np.zeros(capacity, dtype=np.float64)
+        self._cost_basis = np.zeros(capacity, dtype=np.float64)
+        self.version = 0
+
+    @classmethod
+    def from_portfolios(cls, portfolios):
+        store = cls(capacity=max(1024, sum(len(p) for p in portfolios.values())))
+        for username, user_portfolio in portfolios.items():
+            store.add_user(username)
+            for symbol, stock_data in user_portfolio.items():
+                store.set_holding(username, symbol, stock_data['shares'], stock_data['purchase_price'])
+        return store
+
+    @property
+    def symbols(self):
+        """Symbols in column order."""
+        with self._lock:
+            return list(self._symbols)
+
+    def positions(self, username):
+        """Returns [(symbol, shares, cost basis)] for one user, from that user's rows only."""
+        with self._lock:
+            user = self._users.get(username)
+            if user is None:
+                return []
+            return [(self._symbol_names[self._sym_idx[row]], float(self._shares[row]),
+                     float(self._cost_basis[row]))
+                    for row in self._user_rows.get(user, ())]
+
+    def add_user(self, username):
+        with self._lock:
+            return self._user_index(username)
+
+    def _user_index(self, username):
+        index = self._users.get(username)
+        if index is None:
+            index = self._users[username] = len(self._users)
+            self.version += 1
+        return index
+
+    def _grow(self):
+        capacity = len(self._shares) * 2
+        for name in ('_user_idx', '_sym_idx', '_shares', '_cost_basis'):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def set_holding(self, username, symbol, shares, purchase_price):
+        """Inserts, updates or (when shares is 0) removes one position."""
+        with self._lock:
+            user = self._user_index(username)
+            column = self._symbols.get(symbol)
+            if column is None:
+                column = self._symbols[symbol] = len(self._symbols)
+                self._symbol_names.append(symbol)
+            row = self._rows.get((user, column))
+
+            if shares <= 0:
+                if row is not None:
+                    self._remove_row(row)
+            else:
+                if row is None:
+                    if self._size == len(self._shares):
+                        self._grow()
+                    row = self._rows[(user, column)] = self._size
+                    self._user_rows.setdefault(user, set()).add(row)
+                    self._size += 1
+                    self._user_idx[row] = user
+                    self._sym_idx[row] = column
+                self._shares[row] = shares
+                self._cost_basis[row] = purchase_price
+            self.version += 1
+
+    def _remove_row(self, row):
+        # Swap the last row into the hole so arrays stay dense
+        last = self._size - 1
+        user = int(self._user_idx[row])
+        del self._rows[(user, int(self._sym_idx[row]))]
+        self._user_rows[user].discard(row)
+        if row != last:
+            for array in (self._user_idx, self._sym_idx, self._shares, self._cost_basis):
+                array[row] = array[last]
+            moved = int(self._user_idx[row])
+            self._rows[(moved, int(self._sym_idx[row]))] = row
+            self._user_rows[moved].discard(last)
+            self._user_rows[moved].add(row)
+        self._size = last
+
+    def valuate(self, prices):
+        """Values every user at once. prices is {symbol: price or None}, or a
+        float array aligned with the symbol columns (NaN for unknown)."""
+        with self._lock:
+            n = self._size
+            user_idx = self._user_idx[:n].copy()
+            sym_idx = self._sym_idx[:n].copy()
+            shares = self._shares[:n].copy()
+            cost_basis = self._cost_basis[:n].copy()
+            user_index = dict(self._users)
+            symbols = list(self._symbols)
+
+        if isinstance(prices, dict):
+            prices = np.array([np.nan if prices.get(s) is None else prices[s] for s in symbols],
+                              dtype=np.float64)
+        if len(prices) < len(symbols):
+            prices = np.concatenate([prices, np.full(len(symbols) - len(prices), np.nan)])
+
+        position_prices = prices[sym_idx]
+        position_prices = np.where(np.isnan(position_prices), cost_basis, position_prices)
+        n_users = len(user_index)
+        value = np.bincount(user_idx, weights=shares * position_prices, minlength=n_users)
+        cost = np.bincount(user_idx, weights=shares * cost_basis, minlength=n_users)
+        return Valuation(user_index, value, cost)